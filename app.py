@@ -13,10 +13,22 @@ from ui import (
     sentiment_ui,
 )
 
+from modules import metrics, chunker
+from modules.workspace import get_workspace
+
 # Load API keys
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# Sweep orphaned temp files (once per process)
+get_workspace()
+
+# Prometheus /metrics endpoint when METRICS_PORT is set (once per process)
+metrics.start_server()
+
+# Exact-count tokenizers when LLM_TOKENIZERS=1, fetched in the background (once per process)
+chunker.preload_tokenizers()
+
 # App branding
 st.set_page_config(
     page_title="Natiq 🗣️💡",
@@ -62,6 +74,9 @@ openrouter_model = st.sidebar.selectbox(
     index=0
 )
 
+# LLM usage of this session, filled in after the page has run (see the end of this file)
+usage_box = st.sidebar.container()
+
 # Footer in sidebar
 st.sidebar.markdown("---")
 st.sidebar.markdown(
@@ -134,3 +149,14 @@ elif st.session_state["feature_choice"] == "🌐 Translation":
 
 elif st.session_state["feature_choice"] == "💭 Sentiment Analysis":
     sentiment_ui.render(model=openrouter_model)
+
+# Session totals including the calls the page just made
+session_usage = metrics.session_summary()
+if session_usage:
+    with usage_box.expander("📊 LLM usage (this session)"):
+        for feature, totals in sorted(session_usage.items()):
+            tokens = totals["prompt_tokens"] + totals["completion_tokens"]
+            st.markdown(
+                f"**{feature}**: {totals['calls']} calls ({totals['cached']} cached, {totals['errors']} failed), "
+                f"{tokens:,} tokens, ${totals['cost_usd']:.4f}, {totals['llm_seconds']:.1f}s in LLM calls"
+            )
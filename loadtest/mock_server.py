@@ -0,0 +1,218 @@
+"""
+Local stand-in for OpenRouter's /api/v1/chat/completions endpoint.
+
+    python -m loadtest.mock_server --port 8999 --latency lognormal --mean-ms 800 --error-rate 0.02
+
+then point the app at it with OPENROUTER_URL=http://127.0.0.1:8999/api/v1/chat/completions
+"""
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOREM = (
+    "the speaker explains the main idea with clear examples and then moves on to "
+    "practical advice about planning testing and measuring results before the next topic"
+).split()
+
+
+class MockConfig:
+    """
+    Response behaviour: latency (time to first byte) drawn from a distribution,
+    failure rates, reply length and streaming speed.
+    latency is "fixed", "uniform" (mean ± jitter) or "lognormal" (mean with a long tail).
+    """
+
+    def __init__(self, latency: str = "lognormal", mean_ms: float = 500, jitter_ms: float = 250,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after_sec: float = 1.0,
+                 reply_words: int = 80, stream_tokens_per_sec: float = 200, seed: int = None):
+        self.latency = latency
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_sec = retry_after_sec
+        self.reply_words = reply_words
+        self.stream_tokens_per_sec = stream_tokens_per_sec
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        with self._lock:
+            return self.random.random()
+
+    def latency_sec(self) -> float:
+        with self._lock:
+            if self.latency == "fixed":
+                ms = self.mean_ms
+            elif self.latency == "uniform":
+                ms = self.random.uniform(self.mean_ms - self.jitter_ms, self.mean_ms + self.jitter_ms)
+            else:
+                # Lognormal with the requested mean; jitter sets the spread
+                sigma = max(0.05, min(2.0, self.jitter_ms / max(self.mean_ms, 1)))
+                ms = self.random.lognormvariate(0, sigma) * self.mean_ms / math.exp(sigma ** 2 / 2)
+        return max(0.0, ms) / 1000
+
+
+def fake_reply(prompt: str, words: int, rng) -> str:
+    """A reply shaped like what the calling module expects (JSON for diarization/sentiment)."""
+    text = " ".join(rng.choice(LOREM) for _ in range(max(1, words)))
+
+    if "Split the following conversation into speaker turns" in prompt:
+        turns = [{"speaker": f"Speaker {i % 2 + 1}", "text": " ".join(text.split()[i::3])} for i in range(3)]
+        return json.dumps(turns)
+    if "Respond with only a JSON array" in prompt:
+        # Batched sentiment: sometimes drop an item so the caller has to re-ask
+        indices = [int(i) for i in re.findall(r"^\s*\[(\d+)\]\s*$", prompt, re.M)]
+        items = [
+            {"index": i, "label": rng.choice(["POSITIVE", "NEGATIVE", "NEUTRAL"]),
+             "score": round(rng.random(), 2), "explanation": text[:80]}
+            for i in indices if rng.random() > 0.1
+        ]
+        return json.dumps(items)
+    if "Analyze the sentiment" in prompt:
+        label = rng.choice(["POSITIVE", "NEGATIVE", "NEUTRAL"])
+        return json.dumps({"label": label, "score": round(rng.random(), 2), "explanation": text[:120]})
+    if "Question Answering assistant" in prompt and rng.random() < 0.3:
+        return "Answer not found in context."
+    return text
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server.count("requests")
+
+        time.sleep(config.latency_sec())
+
+        draw = config.draw()
+        if draw < config.rate_limit_rate:
+            server.count("429")
+            return self._json(429, {"error": {"code": 429, "message": "Rate limit exceeded"}},
+                              {"Retry-After": str(config.retry_after_sec)})
+        if draw < config.rate_limit_rate + config.error_rate:
+            server.count("500")
+            return self._json(500, {"error": {"code": 500, "message": "Mock upstream error"}})
+
+        prompt = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        words = min(config.reply_words, payload.get("max_tokens") or config.reply_words)
+        reply = fake_reply(prompt, words, config.random)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if payload.get("stream"):
+            server.count("streamed")
+            return self._stream(reply, usage, config)
+
+        server.count("200")
+        self._json(200, {
+            "id": "mock", "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, reply: str, usage: dict, config: MockConfig):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        pieces = re.findall(r"\S+\s*", reply)
+        delay = 1 / config.stream_tokens_per_sec if config.stream_tokens_per_sec > 0 else 0
+        for piece in pieces:
+            event = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(delay)
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockHandler)
+        self.config = config
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def start(self):
+        """Serve from a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, name="mock-openrouter", daemon=True).start()
+        return self
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--mean-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--reply-words", type=int, default=80)
+    parser.add_argument("--stream-tps", type=float, default=200, help="streamed tokens per second")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency=args.latency, mean_ms=args.mean_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after_sec=args.retry_after,
+        reply_words=args.reply_words, stream_tokens_per_sec=args.stream_tps, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockServer(config_from_args(args), args.host, args.port)
+    print(f"Mock OpenRouter listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
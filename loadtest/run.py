@@ -0,0 +1,267 @@
+"""
+End-to-end load test of the LLM features against the mock (or any) OpenRouter endpoint.
+
+    python -m loadtest.run --users 8 --iterations 5 --scenarios qa,summarize,sentiment
+    python -m loadtest.run --url http://127.0.0.1:8999/api/v1/chat/completions --no-cache
+
+Without --url a mock server is started in-process (see loadtest.mock_server for its options).
+Each user is a thread with its own session id and transcript, running the chosen scenarios in turn.
+Every run starts with an empty LLM cache; --warm-cache reuses the one left by earlier runs.
+"""
+import os
+import sys
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+from loadtest import mock_server
+
+TOPIC = "how small teams can ship reliable software"
+QUESTION = "What advice does the speaker give about testing?"
+
+SENTENCES = [
+    "We started the project with a very small team and a tight deadline.",
+    "The first version was slow, so we measured where the time actually went.",
+    "Most of the delay came from waiting on the network rather than computing.",
+    "After adding caching, the same requests finished several times faster.",
+    "Testing every change before release saved us from many late surprises.",
+    "The speaker recommends planning the work in short and focused iterations.",
+    "Users noticed the improvement immediately and sent positive feedback.",
+    "Some features were removed because nobody used them in practice.",
+]
+
+
+def make_transcript(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    sentences, count = [], 0
+    while count < words:
+        sentence = rng.choice(SENTENCES)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+
+def _consume(stream):
+    """Drain a text stream; returns seconds until the first piece (None if empty)."""
+    start = time.perf_counter()
+    first = None
+    for _ in stream:
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def _scenarios():
+    """name -> fn(transcript) returning time-to-first-token for streaming scenarios (else None)."""
+
+    def diarization(text):
+        from modules import diarization
+        diarization.diarize_transcript(text)
+
+    def qa(text):
+        from modules import qa
+        qa.answer_question(QUESTION, text)
+
+    def qa_stream(text):
+        from modules import qa
+        return _consume(qa.answer_question_stream(QUESTION, text))
+
+    def sentiment(text):
+        from modules import sentiment
+        sentiment.analyze_sentiment(text)
+
+    def sentiment_batched(text):
+        from modules import sentiment
+        sentiment.analyze_sentiment(text, batched=True)
+
+    def summarize(text):
+        from modules import summarizer
+        summarizer.summarize_llm(text)
+
+    def summarize_stream(text):
+        from modules import summarizer
+        return _consume(summarizer.summarize_llm_stream(text))
+
+    def translate(text):
+        from modules import translator
+        translator.translate_llm(text, target_lang="ar")
+
+    def translate_stream(text):
+        from modules import translator
+        return _consume(translator.translate_llm_stream(text, target_lang="ar"))
+
+    def video_script(text):
+        from modules import video_script_generator
+        video_script_generator.generate_structured_video_script(TOPIC, duration=1)
+
+    def video_script_stream(text):
+        from modules import video_script_generator
+        return _consume(video_script_generator.generate_structured_video_script_stream(TOPIC, duration=1))
+
+    def podcast(text):
+        from modules import podcast_generator
+        podcast_generator.generate_dialogue_script(TOPIC, duration=1)
+
+    return {
+        "diarization": diarization, "qa": qa, "qa_stream": qa_stream, "sentiment": sentiment,
+        "sentiment_batched": sentiment_batched,
+        "summarize": summarize, "summarize_stream": summarize_stream,
+        "translate": translate, "translate_stream": translate_stream,
+        "video_script": video_script, "video_script_stream": video_script_stream, "podcast": podcast,
+    }
+
+
+SCENARIOS = list(_scenarios())
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_load(scenarios, users: int, iterations: int, words: int, same_text: bool = False):
+    """
+    Run every user's iterations concurrently.
+    Returns (records, wall_seconds); each record is
+    {"scenario", "user", "latency", "ttft", "error"}.
+    """
+    from modules import rate_limiter
+
+    table = _scenarios()
+    records = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(index):
+        text = make_transcript(words, seed=0 if same_text else index)
+        barrier.wait()
+        with rate_limiter.session_scope(f"loadtest-{index}"):
+            for i in range(iterations):
+                name = scenarios[(index + i) % len(scenarios)]
+                start = time.perf_counter()
+                ttft, error = None, None
+                try:
+                    ttft = table[name](text)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                record = {"scenario": name, "user": index, "latency": time.perf_counter() - start,
+                          "ttft": ttft, "error": error}
+                with lock:
+                    records.append(record)
+
+    threads = [threading.Thread(target=user, args=(i,), name=f"user-{i}") for i in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, time.perf_counter() - start
+
+
+def report(records, wall: float, out=sys.stdout):
+    by_scenario = defaultdict(list)
+    for r in records:
+        by_scenario[r["scenario"]].append(r)
+
+    header = f"{'scenario':<22}{'runs':>6}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'ttft p50':>10}"
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for name in sorted(by_scenario):
+        rows = by_scenario[name]
+        latencies = [r["latency"] for r in rows if not r["error"]]
+        ttfts = [r["ttft"] for r in rows if r["ttft"] is not None]
+        errors = sum(1 for r in rows if r["error"])
+        ttft = f"{percentile(ttfts, 50):>10.2f}" if ttfts else f"{'-':>10}"
+        print(f"{name:<22}{len(rows):>6}{errors:>8}{percentile(latencies, 50):>9.2f}"
+              f"{percentile(latencies, 95):>9.2f}{percentile(latencies, 99):>9.2f}{ttft}", file=out)
+
+    ok = [r["latency"] for r in records if not r["error"]]
+    print("-" * len(header), file=out)
+    print(f"{len(records)} runs in {wall:.1f}s: {len(records) / wall:.2f} runs/s, "
+          f"{len(records) - len(ok)} errors, overall p50 {percentile(ok, 50):.2f}s "
+          f"p95 {percentile(ok, 95):.2f}s p99 {percentile(ok, 99):.2f}s", file=out)
+
+    first_errors = {}
+    for r in records:
+        if r["error"]:
+            first_errors.setdefault(r["scenario"], r["error"])
+    for name, error in sorted(first_errors.items()):
+        print(f"  {name}: {error[:200]}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the LLM features against a mock OpenRouter")
+    parser.add_argument("--users", type=int, default=4, help="concurrent users")
+    parser.add_argument("--iterations", type=int, default=3, help="runs per user")
+    parser.add_argument("--scenarios", default="qa,summarize,sentiment,translate,diarization",
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--words", type=int, default=1500, help="transcript length in words")
+    parser.add_argument("--same-text", action="store_true",
+                        help="give every user the same transcript (identical requests hit the cache or coalesce)")
+    parser.add_argument("--url", help="existing endpoint; by default a mock server is started in-process")
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument("--no-cache", action="store_true", help="disable the LLM response cache")
+    cache.add_argument("--warm-cache", action="store_true",
+                       help="reuse the cache file of earlier runs instead of starting from an empty one")
+    parser.add_argument("--cache-path", default=os.path.join("cache", "loadtest_llm_cache.sqlite3"),
+                        help="LLM cache file used with --warm-cache (kept apart from the app's cache)")
+    parser.add_argument("--no-coalesce", action="store_true", help="send identical in-flight requests separately")
+    mock_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    server = None
+    url = args.url
+    if url is None:
+        server = mock_server.MockServer(mock_server.config_from_args(args)).start()
+        url = server.url
+
+    # A cold cache by default, so the numbers measure real requests rather than earlier runs
+    cache_dir = None
+    if args.no_cache:
+        cache_mode = "off"
+    elif args.warm_cache:
+        cache_mode = f"warm ({args.cache_path})"
+    else:
+        cache_dir = tempfile.mkdtemp(prefix="loadtest-cache-")
+        args.cache_path = os.path.join(cache_dir, "llm_cache.sqlite3")
+        cache_mode = "cold (empty per run)"
+
+    # The modules read these at import time, so set them before importing anything from modules
+    os.environ["OPENROUTER_URL"] = url
+    os.environ.setdefault("OPENROUTER_API_KEY", "loadtest")
+    os.environ["LLM_CACHE"] = "0" if args.no_cache else "1"
+    os.environ["LLM_CACHE_PATH"] = args.cache_path
+    os.environ["LLM_COALESCE"] = "0" if args.no_coalesce else "1"
+    # Stay offline: no tokenizer downloads from the HuggingFace Hub unless asked for
+    os.environ.setdefault("LLM_TOKENIZERS", "0")
+
+    print(f"{args.users} users x {args.iterations} runs against {url}")
+    print(f"LLM cache: {cache_mode}, coalescing: {'off' if args.no_coalesce else 'on'}, "
+          f"transcripts: {'shared' if args.same_text else 'one per user'}")
+    try:
+        records, wall = run_load(scenarios, args.users, args.iterations, args.words, args.same_text)
+        report(records, wall)
+    finally:
+        if server is not None:
+            print(f"mock server: {dict(server.stats)}")
+            server.shutdown()
+        if cache_dir is not None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,281 @@
-def chunk_text(text: str, max_len: int = 2500):
+import os
+import math
+import re
+import time
+import threading
+from modules.transcript import Transcript
+
+
+WORD = re.compile(r"\S+")
+
+
+def iter_spans(text: str, max_len: int = 2500, overlap: int = 0):
+    """
+    Yield (start, end) character spans of at most max_len characters, cut between words.
+    With overlap > 0, each span starts at the first word within `overlap` characters
+    before the previous span's end. A single word longer than max_len is its own span.
+    """
+    chunk_start = last_end = None
+    word_starts = []    # starts of the words in the current span (for overlap)
+
+    for match in WORD.finditer(text):
+        start, end = match.span()
+        if chunk_start is None:
+            chunk_start = start
+        elif end - chunk_start > max_len:
+            yield chunk_start, last_end
+            new_start = start
+            if overlap > 0:
+                new_start = next((s for s in word_starts if s >= last_end - overlap and s > chunk_start), start)
+                if end - new_start > max_len:
+                    new_start = start
+            chunk_start = new_start
+            word_starts = [s for s in word_starts if s >= new_start]
+        word_starts.append(start)
+        last_end = end
+
+    if chunk_start is not None:
+        yield chunk_start, last_end
+
+
+def chunk_text(text: str, max_len: int = 2500, overlap: int = 0):
     """
     Split transcript into manageable chunks by words.
     Useful for QA, Diarization, Summarization, etc.
+    A Transcript is split on its real segment boundaries instead.
     """
-    words = text.split()
-    chunks, current, length = [], [], 0
+    if isinstance(text, Transcript):
+        return [piece.text for piece in text.split(max_len)]
+
+    return [text[start:end] for start, end in iter_spans(text, max_len, overlap)]
+
+
+# =======================
+# Token-budget chunking
+# =======================
+
+# Context windows (tokens) of the models we send text to
+MODEL_CONTEXT = {
+    "mistralai/mistral-7b-instruct": 32768,
+    "mistralai/mistral-nemo-instruct-2407": 128000,
+    "meta-llama/llama-3-8b-instruct": 8192,
+    "anthropic/claude-3-sonnet": 200000,
+    "openai/gpt-4o-mini": 128000,
+    "facebook/bart-large-cnn": 1024,
+    "csebuetnlp/mT5_multilingual_XLSum": 512,
+    "Helsinki-NLP/opus-mt-en-ar": 512,
+    "Helsinki-NLP/opus-mt-ar-en": 512,
+}
+DEFAULT_CONTEXT = 8192
+
+# HuggingFace tokenizers of the OpenRouter models, for exact counts (opt-in with LLM_TOKENIZERS=1;
+# the Mistral and Llama repos are gated, so the Hub token must have access to them)
+MODEL_TOKENIZERS = {
+    "mistralai/mistral-7b-instruct": "mistralai/Mistral-7B-Instruct-v0.3",
+    "mistralai/mistral-nemo-instruct-2407": "mistralai/Mistral-Nemo-Instruct-2407",
+    "meta-llama/llama-3-8b-instruct": "meta-llama/Meta-Llama-3-8B-Instruct",
+}
+LLM_TOKENIZERS = os.getenv("LLM_TOKENIZERS", "0") == "1"
+TOKENIZER_DIR = os.path.join(os.getcwd(), "models")
+TOKENIZER_RETRY_SEC = 300   # wait before retrying a load that failed on a network error
+
+# Share of the context window filled with exact counts, and with estimates
+EXACT_MARGIN = 0.95
+ESTIMATE_MARGIN = 0.8
+
+_tokenizers = {}            # model -> tokenizer, or None after a permanent failure
+_tokenizer_locks = {model: threading.Lock() for model in MODEL_TOKENIZERS}
+_tokenizer_retry_at = {}    # model -> monotonic time before which a failed load is not retried
+_preload_started = False
+
+# Sentence ends in English and Arabic (. ! ? … ؟ ۔) or line breaks
+SENTENCE_END = re.compile(r"(?<=[.!?…؟۔])\s+|\s*\n+\s*")
+ARABIC_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast token estimate without a tokenizer: ~4 characters per token for Latin text,
+    and one token per character of Arabic script, which small-vocabulary models
+    (e.g. Mistral's 32k SentencePiece) split into single characters or bytes.
+    """
+    arabic = len(ARABIC_CHARS.findall(text))
+    return math.ceil((len(text) - arabic) / 4 + arabic)
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    """Exact count with a HuggingFace tokenizer when given, otherwise estimate_tokens()."""
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return estimate_tokens(text)
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT.get(model, DEFAULT_CONTEXT)
+
+
+def _permanent_failure(error: BaseException) -> bool:
+    """Whether retrying a tokenizer load cannot help (no transformers, gated or unknown repo)."""
+    if isinstance(error, ImportError):
+        return True
+    try:
+        from huggingface_hub.utils import RepositoryNotFoundError    # GatedRepoError is a subclass
+    except ImportError:
+        return False
+    while error is not None:
+        if isinstance(error, RepositoryNotFoundError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
 
-    for word in words:
-        length += len(word) + 1
-        if length > max_len:
-            chunks.append(" ".join(current))
-            current, length = [word], len(word) + 1
+def model_tokenizer(model: str):
+    """
+    The model's HuggingFace tokenizer (LLM_TOKENIZERS=1), loaded on first use or by
+    preload_tokenizers(). Returns None when unknown, unavailable or being loaded by another
+    thread, so chunking falls back to estimates instead of waiting on the Hub.
+    """
+    name = MODEL_TOKENIZERS.get(model)
+    if name is None or not LLM_TOKENIZERS:
+        return None
+    if model in _tokenizers:
+        return _tokenizers[model]
+
+    lock = _tokenizer_locks[model]
+    if time.monotonic() < _tokenizer_retry_at.get(model, 0) or not lock.acquire(blocking=False):
+        return None
+    try:
+        if model not in _tokenizers:
+            from transformers import AutoTokenizer
+            _tokenizers[model] = AutoTokenizer.from_pretrained(name, cache_dir=TOKENIZER_DIR)
+    except Exception as e:
+        if _permanent_failure(e):
+            _tokenizers[model] = None
         else:
-            current.append(word)
+            _tokenizer_retry_at[model] = time.monotonic() + TOKENIZER_RETRY_SEC
+        return None
+    finally:
+        lock.release()
+    return _tokenizers[model]
+
+
+def preload_tokenizers():
+    """Load every mapped tokenizer from a daemon thread (once per process; LLM_TOKENIZERS=1 only)."""
+    global _preload_started
+    if not LLM_TOKENIZERS or _preload_started:
+        return
+    _preload_started = True
+
+    def load():
+        for model in MODEL_TOKENIZERS:
+            model_tokenizer(model)
+
+    threading.Thread(target=load, name="tokenizers", daemon=True).start()
+
+
+def iter_sentence_spans(text: str):
+    """Yield (start, end) spans of the sentences in text, without surrounding whitespace."""
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        yield from _trimmed(text, start, match.start())
+        start = match.end()
+    yield from _trimmed(text, start, len(text))
+
+
+def _trimmed(text: str, start: int, end: int):
+    piece = text[start:end]
+    stripped = piece.strip()
+    if stripped:
+        offset = start + len(piece) - len(piece.lstrip())
+        yield offset, offset + len(stripped)
+
+
+def split_sentences(text: str):
+    return [text[start:end] for start, end in iter_sentence_spans(text)]
+
 
-    if current:
-        chunks.append(" ".join(current))
+def iter_token_spans(text: str, max_tokens: int, tokenizer=None):
+    """
+    Yield (start, end) spans packing whole sentences into at most max_tokens.
+    A single sentence longer than the budget is split between words.
+    """
+    max_tokens = max(1, max_tokens)
+    chunk_start = chunk_end = None
+    used = 0
+
+    for s_start, s_end in iter_sentence_spans(text):
+        tokens = count_tokens(text[s_start:s_end], tokenizer) + 1
+        if tokens > max_tokens:
+            if chunk_start is not None:
+                yield chunk_start, chunk_end
+            chunk_start, used = None, 0
+            for match in WORD.finditer(text, s_start, s_end):
+                word_tokens = count_tokens(match.group(), tokenizer) + 1
+                if chunk_start is not None and used + word_tokens > max_tokens:
+                    yield chunk_start, chunk_end
+                    chunk_start, used = None, 0
+                if chunk_start is None:
+                    chunk_start = match.start()
+                chunk_end = match.end()
+                used += word_tokens
+            continue
+
+        if chunk_start is not None and used + tokens > max_tokens:
+            yield chunk_start, chunk_end
+            chunk_start, used = None, 0
+        if chunk_start is None:
+            chunk_start = s_start
+        chunk_end = s_end
+        used += tokens
+
+    if chunk_start is not None:
+        yield chunk_start, chunk_end
+
+
+def chunk_by_tokens(text: str, max_tokens: int, tokenizer=None):
+    """
+    Pack whole sentences into chunks of at most max_tokens (see iter_token_spans).
+    A Transcript is packed by whole segments instead.
+    """
+    if isinstance(text, Transcript):
+        return _chunk_segments(text, max_tokens, tokenizer)
+    return [text[start:end] for start, end in iter_token_spans(text, max_tokens, tokenizer)]
 
+
+def _chunk_segments(transcript: Transcript, max_tokens: int, tokenizer=None):
+    """Pack consecutive segments into chunks of at most max_tokens; an oversized segment is split on its own."""
+    max_tokens = max(1, max_tokens)
+    chunks, texts, used = [], [], 0
+    for text in transcript.texts:
+        if not text:
+            continue
+        tokens = count_tokens(text, tokenizer) + 1
+        if texts and used + tokens > max_tokens:
+            chunks.append(" ".join(texts))
+            texts, used = [], 0
+        if tokens > max_tokens:
+            chunks.extend(chunk_by_tokens(text, max_tokens, tokenizer))
+            continue
+        texts.append(text)
+        used += tokens
+    if texts:
+        chunks.append(" ".join(texts))
     return chunks
+
+
+def chunk_for_model(text: str, model: str, prompt_tokens: int = 0, output_tokens: int = 0,
+                    max_chunk_tokens: int = None, tokenizer=None):
+    """
+    Split text (a string or a Transcript, cut on segment boundaries) into the fewest
+    chunks that fit model's context window after reserving room for the prompt template
+    and the response.
+    Tokens are counted with the model's tokenizer when available; estimates
+    get a wider safety margin.
+    max_chunk_tokens caps the chunk size (e.g. when the output grows with the input).
+    """
+    tokenizer = tokenizer or model_tokenizer(model)
+    margin = EXACT_MARGIN if tokenizer is not None else ESTIMATE_MARGIN
+    budget = int(context_window(model) * margin) - prompt_tokens - output_tokens
+    if max_chunk_tokens:
+        budget = min(budget, max_chunk_tokens)
+    return chunk_by_tokens(text, budget, tokenizer)
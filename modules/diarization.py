@@ -1,28 +1,25 @@
-import os
-import requests
 import json
-from dotenv import load_dotenv
-from modules.chunker import chunk_text
+from modules.chunker import chunk_for_model
+from modules import metrics
+from modules.openrouter import get_client, fan_out, raise_if_all_failed
 
-load_dotenv()
-
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL = "mistralai/mistral-nemo-instruct-2407"
 
 
-def diarize_transcript(transcript: str, model: str = MODEL):
+def diarize_transcript(transcript: str, model: str = MODEL, max_workers: int = None):
     """
     Diarize transcript in chunks and merge results into a single JSON.
+    Chunks are sent concurrently (max_workers, default LLM_CONCURRENCY); a failed chunk
+    becomes a warning segment instead of failing the whole transcript.
     """
     if not transcript.strip():
         return [{"speaker": "Unknown", "text": ""}]
 
-    # Use chunker from modules
-    chunks = chunk_text(transcript, max_len=2500)
-    all_segments = []
+    # The JSON output repeats the input, so chunks must also fit in max_tokens
+    chunks = chunk_for_model(transcript, model, prompt_tokens=150, output_tokens=2000, max_chunk_tokens=1400)
 
-    for idx, chunk in enumerate(chunks, 1):
+    def diarize_chunk(item):
+        idx, chunk = item
         prompt = f"""
         You are a diarization assistant.
         Split the following conversation into speaker turns.
@@ -34,22 +31,19 @@ def diarize_transcript(transcript: str, model: str = MODEL):
         Return the result as JSON list of objects with keys: "speaker", "text".
         """
 
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0,
-            "max_tokens": 2000
-        }
+        return get_client().chat(
+            [{"role": "user", "content": prompt}], model, temperature=0, max_tokens=2000, feature="diarization"
+        ).strip()
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json"
-        }
+    with metrics.track("diarization", chunks=len(chunks)):
+        results = fan_out(diarize_chunk, enumerate(chunks, 1), max_workers)
+        raise_if_all_failed(results)
 
-        response = requests.post(OPENROUTER_URL, headers=headers, json=payload)
-        response.raise_for_status()
-
-        result_text = response.json()["choices"][0]["message"]["content"].strip()
+    all_segments = []
+    for idx, result_text in enumerate(results, 1):
+        if isinstance(result_text, Exception):
+            all_segments.append({"speaker": f"Part {idx}", "text": f"⚠️ Failed: {result_text}"})
+            continue
 
         try:
             part_json = json.loads(result_text)
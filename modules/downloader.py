@@ -1,37 +1,164 @@
 import os
+import glob
+import json
+import subprocess
+import threading
+from contextlib import contextmanager
 import yt_dlp
-from pydub import AudioSegment
+from yt_dlp.extractor.youtube import YoutubeIE
+from modules.workspace import get_workspace, TEMP_DIR
+
+# Output formats: name -> (codec, extra ffmpeg output args)
+# "wav16k" is exactly what Whisper consumes, so the transcriber can skip its own decode.
+AUDIO_FORMATS = {
+    "wav16k": ("wav", ["-ar", "16000", "-ac", "1"]),
+    "wav": ("wav", []),
+}
+
+# Download cache: (video_id, format) -> [lock, callers using it], so concurrent requests
+# fetch once; an entry is dropped when its last caller is done
+_download_locks = {}
+_download_locks_guard = threading.Lock()
 
-TEMP_DIR = "temp"
-os.makedirs(TEMP_DIR, exist_ok=True)
 
 def save_file(uploaded_file):
-    """Save an uploaded file locally in the temp directory."""
-    path = os.path.join(TEMP_DIR, uploaded_file.name)
-    with open(path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return path
-
-def download_youtube(url):
-    """Download audio from YouTube and convert it to WAV using yt-dlp + pydub."""
-    output_path = os.path.join(TEMP_DIR, "%(id)s.%(ext)s")
-
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": output_path,
-        "quiet": True,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-        downloaded_file = ydl.prepare_filename(info)
-
-    # Set WAV file name
-    base, _ = os.path.splitext(downloaded_file)
-    wav_path = f"{base}.wav"
-
-    # Convert audio using pydub
-    audio = AudioSegment.from_file(downloaded_file)
-    audio.export(wav_path, format="wav")
+    """
+    Save an uploaded file locally in the temp directory.
+    The upload is streamed in 1 MB blocks and named by its content hash, so the same
+    upload is stored once; video containers keep only their audio track.
+    """
+    _, ext = os.path.splitext(uploaded_file.name)
+    uploaded_file.seek(0)
+    path = get_workspace().store_stream(uploaded_file, suffix=ext.lower())
+    return extract_audio_track(path)
+
+
+def probe_streams(path: str):
+    """List the streams of a media file via ffprobe (empty list if it cannot be probed)."""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "stream=codec_type,codec_name:stream_disposition=attached_pic",
+        "-of", "json", path
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+        return json.loads(out).get("streams", [])
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return []
+
+
+def extract_audio_track(path: str) -> str:
+    """
+    If path is a video container (mp4/mkv/...), stream-copy its first audio track
+    into a Matroska audio file without re-encoding and delete the original.
+    Audio-only files (cover art included) are returned untouched.
+    """
+    streams = probe_streams(path)
+    has_video = any(
+        s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")
+        for s in streams
+    )
+    has_audio = any(s.get("codec_type") == "audio" for s in streams)
+    if not (has_video and has_audio):
+        return path
+
+    audio_path = f"{os.path.splitext(path)[0]}.mka"
+    if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
+        # Same upload seen before: its audio track is already extracted
+        os.remove(path)
+        get_workspace().touch(audio_path)
+        return audio_path
+
+    # Extract under a scratch name so an interrupted copy is never taken for a finished one
+    tmp_path = get_workspace().temp_path(".mka")
+    try:
+        subprocess.run([
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", path,
+            "-map", "0:a:0", "-vn", "-c:a", "copy", tmp_path
+        ], check=True)
+        os.replace(tmp_path, audio_path)
+    except (OSError, subprocess.CalledProcessError):
+        # Fall back to the full file; the transcriber can still decode it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return path
+
+    os.remove(path)
+    get_workspace().register(audio_path)
+    return audio_path
+
+
+def video_id(url: str) -> str:
+    """Resolve the video ID, parsing YouTube URLs locally and asking yt-dlp otherwise."""
+    if YoutubeIE.suitable(url):
+        vid = YoutubeIE.get_temp_id(url)
+        if vid:
+            return vid
+
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+    return info["id"]
+
+
+@contextmanager
+def _download_lock(key):
+    """Hold the lock of key for the block, shared by every concurrent caller with the same key."""
+    with _download_locks_guard:
+        entry = _download_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _download_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _download_locks[key]
+
+
+def _output_path(vid: str, fmt: str) -> str:
+    codec, _ = AUDIO_FORMATS[fmt]
+    name = f"{vid}.{codec}" if fmt == codec else f"{vid}.{fmt}.{codec}"
+    return os.path.join(TEMP_DIR, name)
+
+
+def download_youtube(url, fmt="wav16k"):
+    """
+    Download the best audio stream from YouTube, then transcode it with one ffmpeg pass
+    (yt-dlp's ExtractAudio postprocessor), by default straight to 16kHz mono WAV.
+    Files are cached by video ID and format; concurrent calls for the same video wait
+    for the first download instead of fetching it again.
+    """
+    codec, ffmpeg_args = AUDIO_FORMATS[fmt]
+    vid = video_id(url)
+    wav_path = _output_path(vid, fmt)
+
+    with _download_lock((vid, fmt)):
+        if os.path.exists(wav_path) and os.path.getsize(wav_path) > 0:
+            get_workspace().touch(wav_path)
+            return wav_path
+
+        # Download and transcode under a scratch name and move only the finished file
+        # into place, so a killed download or transcode never leaves a truncated cache hit
+        tmp_base = get_workspace().temp_path("")
+        ydl_opts = {
+            "format": "bestaudio/best",
+            "outtmpl": f"{tmp_base}.%(ext)s",
+            "quiet": True,
+            "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": codec}],
+            "postprocessor_args": {"extractaudio+ffmpeg_o": ffmpeg_args},
+        }
+
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                ydl.extract_info(url, download=True)
+            os.replace(f"{tmp_base}.{codec}", wav_path)
+        finally:
+            for leftover in glob.glob(f"{glob.escape(tmp_base)}.*"):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+        get_workspace().register(wav_path)
 
     return wav_path
@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import yt_dlp
+from yt_dlp.extractor.youtube import YoutubeIE
+from modules import downloader
+from modules.workspace import get_workspace
+
+# Bulk ingestion of playlists, channels and URL lists
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+TRANSCRIBE_WORKERS = int(os.getenv("INGEST_TRANSCRIBE_WORKERS", 1))
+
+
+def expand_urls(urls, max_depth: int = 2):
+    """
+    Expand playlist/channel URLs into video URLs with yt-dlp's flat extraction
+    (metadata only, nothing is downloaded). Plain video URLs pass through unchanged.
+    Returns a list of {"url", "title", "error"} dicts in input order.
+    """
+    items = []
+    with yt_dlp.YoutubeDL({"quiet": True, "extract_flat": "in_playlist", "skip_download": True}) as ydl:
+
+        def expand(url, depth):
+            if YoutubeIE.suitable(url) or depth > max_depth:
+                items.append({"url": url, "title": None, "error": None})
+                return
+            try:
+                info = ydl.extract_info(url, download=False)
+            except yt_dlp.utils.DownloadError as e:
+                items.append({"url": url, "title": None, "error": str(e)})
+                return
+
+            if info.get("_type") != "playlist":
+                items.append({"url": info.get("webpage_url") or url, "title": info.get("title"), "error": None})
+                return
+            # Channels list their tabs (Videos, Shorts, ...) as nested playlists
+            for entry in info.get("entries") or []:
+                entry_url = entry.get("url") or entry.get("webpage_url")
+                if not entry_url:
+                    continue
+                if entry.get("_type") == "url" and entry.get("ie_key") not in (None, "Youtube"):
+                    expand(entry_url, depth + 1)
+                else:
+                    items.append({"url": entry_url, "title": entry.get("title"), "error": None})
+
+        for url in urls:
+            expand(url.strip(), 0)
+    return items
+
+
+def ingest_many(urls, max_workers: int = None, transcribe: bool = False, lang: str = "auto",
+                on_progress=None):
+    """
+    Download many URLs (playlists are expanded) through a bounded thread pool.
+    Yields one result dict per item as soon as it finishes, in completion order:
+    {"index", "url", "title", "path", "transcript", "error"}.
+    With transcribe=True each finished download is handed to the transcriber right away.
+    A failing item only sets its own "error"; the rest keep going.
+    on_progress(index, url, stage) is called with stage in
+    "queued", "downloading", "transcribing", "done" or "failed".
+    Downloaded files are protected from workspace quota eviction until they are
+    transcribed or, without transcribe, until the caller asks for the next result.
+    """
+    max_workers = max_workers or INGEST_WORKERS
+    workspace = get_workspace()
+    held = []   # downloaded paths with a workspace handle
+
+    def report(index, url, stage):
+        if on_progress is not None:
+            on_progress(index, url, stage)
+
+    def download(index, item):
+        report(index, item["url"], "downloading")
+        path = downloader.download_youtube(item["url"])
+        workspace.acquire(path)
+        held.append(path)
+        return path
+
+    def release(path):
+        held.remove(path)
+        workspace.release(path)
+
+    def transcribe_file(path):
+        from modules import transcriber
+        try:
+            return transcriber.transcribe(path, lang=lang)
+        finally:
+            release(path)
+
+    items = expand_urls(urls)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest") as downloads, \
+                ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="ingest-asr") as asr:
+            futures = {}
+            for index, item in enumerate(items):
+                result = {"index": index, "url": item["url"], "title": item["title"],
+                          "path": None, "transcript": None, "error": item["error"]}
+                if result["error"]:
+                    report(index, item["url"], "failed")
+                    yield result
+                    continue
+                report(index, item["url"], "queued")
+                futures[downloads.submit(download, index, item)] = result
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = futures.pop(future)
+                    index, url = result["index"], result["url"]
+
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        result["error"] = str(e)
+                        report(index, url, "failed")
+                        yield result
+                        continue
+
+                    if transcribe and result["path"] is None:
+                        # Download finished: queue its transcription and keep collecting
+                        result["path"] = value
+                        report(index, url, "transcribing")
+                        next_future = asr.submit(transcribe_file, value)
+                        futures[next_future] = result
+                        pending.add(next_future)
+                        continue
+
+                    if transcribe:
+                        result["transcript"] = value
+                    else:
+                        result["path"] = value
+                    report(index, url, "done")
+                    yield result
+                    if not transcribe:
+                        # The caller has had its turn with the file
+                        release(value)
+    finally:
+        # Files the generator was closed before using
+        for path in list(held):
+            release(path)
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Persistent LLM response cache (SQLite), shared by every module and session
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SEC = int(os.getenv("LLM_CACHE_TTL_SEC", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 20000))
+PRUNE_EVERY = 100   # puts between prune passes
+
+
+def request_key(payload: dict) -> str:
+    """Fingerprint of everything that determines the reply: model, messages, temperature, max_tokens."""
+    fields = {k: payload.get(k) for k in ("model", "messages", "temperature", "max_tokens")}
+    blob = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Reply texts keyed by request_key(), with a TTL and an LRU bound on the entry count."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_sec: int = LLM_CACHE_TTL_SEC,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, accessed REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def get(self, key: str):
+        """Return the cached reply, or None when missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_sec:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            self._puts += 1
+            if self._puts % PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self):
+        """Drop expired entries, then the least recently used beyond max_entries (caller holds the lock)."""
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_sec,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def prune(self):
+        with self._lock:
+            self._prune()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """Return the process-wide LLM cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
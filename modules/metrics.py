@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.rate_limiter import current_session_id
+
+# In-process LLM metrics, served as Prometheus text on METRICS_PORT (0 = no endpoint)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+MAX_SESSIONS = 1000     # per-session summaries kept (least recently active dropped)
+
+# USD per million (prompt, completion) tokens, used when OpenRouter reports no cost,
+# e.g. LLM_MODEL_PRICES='{"openai/gpt-4o-mini": [0.15, 0.6]}'
+MODEL_PRICES = {
+    model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_MODEL_PRICES", "{}")).items()
+}
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(le, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for le, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += count
+            yield le, total
+
+
+def call_cost(model: str, usage: dict) -> float:
+    """USD cost of one call: OpenRouter's own figure when present, else MODEL_PRICES (0 if unknown)."""
+    if usage.get("cost") is not None:
+        return float(usage["cost"])
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (usage.get("prompt_tokens", 0) * prompt_price
+            + usage.get("completion_tokens", 0) * completion_price) / 1_000_000
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms for LLM calls (per feature, model and status)
+    and for whole feature jobs (per feature, with their chunk counts),
+    plus a running summary per Streamlit session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)           # (feature, model, status) -> count
+        self.tokens = defaultdict(int)          # (feature, model, kind) -> tokens
+        self.cost = defaultdict(float)          # (feature, model) -> USD
+        self.call_latency = defaultdict(Histogram)      # (feature, model) -> seconds
+        self.jobs = defaultdict(int)            # (feature, status) -> count
+        self.job_chunks = defaultdict(int)      # feature -> chunks
+        self.job_latency = defaultdict(Histogram)       # feature -> seconds
+        self.sessions = OrderedDict()           # session id -> feature -> totals
+
+    def _session(self, session_id: str, feature: str) -> dict:
+        """Totals for (session, feature), creating them (caller holds the lock)."""
+        features = self.sessions.get(session_id)
+        if features is None:
+            features = self.sessions[session_id] = {}
+            while len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        return features.setdefault(feature, {
+            "calls": 0, "errors": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost_usd": 0.0, "llm_seconds": 0.0, "jobs": 0, "chunks": 0,
+        })
+
+    def record_call(self, model: str, feature: str, status: str, latency: float, usage: dict = None,
+                    session_id: str = None):
+        """One LLM call; status is "ok", "cached", "coalesced", "cancelled" or an error status."""
+        feature = feature or "other"
+        usage = usage or {}
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        cost = call_cost(model, usage)
+        session_id = session_id or current_session_id()
+
+        with self._lock:
+            self.calls[(feature, model, status)] += 1
+            self.tokens[(feature, model, "prompt")] += prompt_tokens
+            self.tokens[(feature, model, "completion")] += completion_tokens
+            self.cost[(feature, model)] += cost
+            if status not in ("cached", "coalesced"):
+                self.call_latency[(feature, model)].observe(latency)
+
+            totals = self._session(session_id, feature)
+            totals["calls"] += 1
+            totals["errors"] += status not in ("ok", "cached", "coalesced", "cancelled")
+            totals["cached"] += status in ("cached", "coalesced")
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += cost
+            if status not in ("cached", "coalesced"):
+                # A coalesced call only waited on another call's request
+                totals["llm_seconds"] += latency
+
+    def record_job(self, feature: str, chunks: int, latency: float, status: str = "ok", session_id: str = None):
+        """One feature run (e.g. a whole summary) split into chunks LLM requests."""
+        with self._lock:
+            self.jobs[(feature, status)] += 1
+            self.job_chunks[feature] += chunks
+            self.job_latency[feature].observe(latency)
+            totals = self._session(session_id or current_session_id(), feature)
+            totals["jobs"] += 1
+            totals["chunks"] += chunks
+
+    @contextmanager
+    def track(self, feature: str, chunks: int = 1):
+        """Record the enclosed block as one job of feature."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record_job(feature, chunks, time.perf_counter() - start, status)
+
+    def session_summary(self, session_id: str = None) -> dict:
+        """feature -> totals for one session (the current one by default)."""
+        with self._lock:
+            features = self.sessions.get(session_id or current_session_id(), {})
+            return {feature: dict(totals) for feature, totals in features.items()}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, series):
+            for labels, hist in series:
+                for le, count in hist.cumulative():
+                    lines.append(f"{name}_bucket{_labels(**labels, le=le)} {count}")
+                lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+        with self._lock:
+            family("natiq_llm_requests_total", "counter", "LLM calls by feature, model and status.")
+            for (feature, model, status), count in sorted(self.calls.items()):
+                lines.append(f"natiq_llm_requests_total{_labels(feature=feature, model=model, status=status)} {count}")
+
+            family("natiq_llm_tokens_total", "counter", "Tokens reported by OpenRouter usage.")
+            for (feature, model, kind), count in sorted(self.tokens.items()):
+                lines.append(f"natiq_llm_tokens_total{_labels(feature=feature, model=model, type=kind)} {count}")
+
+            family("natiq_llm_cost_usd_total", "counter", "Cost of LLM calls in USD.")
+            for (feature, model), cost in sorted(self.cost.items()):
+                lines.append(f"natiq_llm_cost_usd_total{_labels(feature=feature, model=model)} {cost:.6f}")
+
+            family("natiq_llm_request_seconds", "histogram", "Latency of LLM calls sent to OpenRouter.")
+            histogram("natiq_llm_request_seconds",
+                      [({"feature": f, "model": m}, h) for (f, m), h in sorted(self.call_latency.items())])
+
+            family("natiq_llm_jobs_total", "counter", "Feature runs by status.")
+            for (feature, status), count in sorted(self.jobs.items()):
+                lines.append(f"natiq_llm_jobs_total{_labels(feature=feature, status=status)} {count}")
+
+            family("natiq_llm_job_chunks_total", "counter", "Chunks (LLM requests planned) across feature runs.")
+            for feature, count in sorted(self.job_chunks.items()):
+                lines.append(f"natiq_llm_job_chunks_total{_labels(feature=feature)} {count}")
+
+            family("natiq_llm_job_seconds", "histogram", "End-to-end latency of feature runs.")
+            histogram("natiq_llm_job_seconds", [({"feature": f}, h) for f, h in sorted(self.job_latency.items())])
+
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+
+def track(feature: str, chunks: int = 1):
+    return _registry.track(feature, chunks)
+
+
+def session_summary(session_id: str = None) -> dict:
+    return _registry.session_summary(session_id)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = _registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """
+    Serve /metrics from a daemon thread (once per process; Streamlit reruns are no-ops).
+    Returns the server, or None when port is 0 or already taken by another process.
+    """
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 import streamlit as st
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-import tempfile
+from modules.workspace import get_workspace
 
 load_dotenv()
 
@@ -41,6 +41,21 @@ def create_pdf_from_text(text: str, filename: str) -> str:
     return filename
 
 
+def pdf_for_text(text: str) -> str:
+    """Return a workspace PDF for text, creating it only once per distinct text."""
+    workspace = get_workspace()
+    path = workspace.content_path("pdf", text, suffix=".pdf")
+    if os.path.exists(path):
+        workspace.touch(path)
+        return path
+
+    tmp_path = workspace.temp_path(".pdf.part")
+    create_pdf_from_text(text, tmp_path)
+    os.replace(tmp_path, path)
+    workspace.register(path)
+    return path
+
+
 # Sending Functions
 def send_telegram(message: str, title: str = "Output"):
     """Send text (chunked if needed) and PDF to Telegram chat."""
@@ -60,15 +75,14 @@ def send_telegram(message: str, title: str = "Output"):
         })
 
     # --- Step 2: Create and send PDF ---
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
-        create_pdf_from_text(message, tmpfile.name)
-        with open(tmpfile.name, "rb") as f:
-            files = {"document": f}
-            response = requests.post(
-                f"{base_url}/sendDocument",
-                data={"chat_id": TELEGRAM_CHAT_ID, "caption": f"📄 {title} (Full text also sent above)"},
-                files=files
-            )
+    pdf_path = pdf_for_text(message)
+    with get_workspace().handle(pdf_path), open(pdf_path, "rb") as f:
+        files = {"document": ("output.pdf", f)}
+        response = requests.post(
+            f"{base_url}/sendDocument",
+            data={"chat_id": TELEGRAM_CHAT_ID, "caption": f"📄 {title} (Full text also sent above)"},
+            files=files
+        )
 
     if response.status_code == 200:
         return "✅ Sent to Telegram with text + PDF!"
@@ -90,12 +104,11 @@ def send_email(subject: str, message: str, recipient: str):
         msg.attach(MIMEText(message, "plain"))
 
         # Attach PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
-            create_pdf_from_text(message, tmpfile.name)
-            with open(tmpfile.name, "rb") as f:
-                part = MIMEApplication(f.read(), _subtype="pdf")
-                part.add_header("Content-Disposition", "attachment", filename="output.pdf")
-                msg.attach(part)
+        pdf_path = pdf_for_text(message)
+        with get_workspace().handle(pdf_path), open(pdf_path, "rb") as f:
+            part = MIMEApplication(f.read(), _subtype="pdf")
+            part.add_header("Content-Disposition", "attachment", filename="output.pdf")
+            msg.attach(part)
 
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
             server.starttls()
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from modules import llm_cache, rate_limiter, metrics
+
+load_dotenv()
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Connection settings
+CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", 120))
+MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", 4))
+POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", 16))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Max chunk requests in flight per call
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+
+# Identical concurrent chat() calls share one HTTP request
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1") == "1"
+
+
+class OpenRouterError(Exception):
+    """Non-retryable (or retries exhausted) OpenRouter failure."""
+
+    def __init__(self, status, text: str):
+        super().__init__(f"API Error {status}: {text}")
+        self.status = status
+
+
+def _status(error: BaseException) -> str:
+    """Metrics status label for a failed call."""
+    if isinstance(error, OpenRouterError) and error.status is not None:
+        return str(error.status)
+    return "error"
+
+
+class OpenRouterClient:
+    """
+    One pooled, keep-alive HTTP session for every OpenRouter call,
+    with connect/read timeouts and exponential-backoff retries on 429/5xx
+    that honour the Retry-After header.
+    Requests are paced by the per-model rate limiter, which 429s slow down.
+    Identical cacheable requests already in flight are coalesced (single-flight).
+    Every call is recorded in the metrics registry under its feature.
+    """
+
+    def __init__(self, api_key: str = OPENROUTER_API_KEY, url: str = OPENROUTER_URL,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retries: int = MAX_RETRIES,
+                 backoff: float = 1.0, max_backoff: float = 30.0, pool_size: int = POOL_SIZE,
+                 limiter: rate_limiter.RateLimiter = None):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if limiter is None and rate_limiter.RATE_LIMIT_ENABLED:
+            limiter = rate_limiter.get_limiter()
+        self.limiter = limiter
+        self._inflight = {}     # request_key -> Future of the reply being fetched
+        self._inflight_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter."""
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _send(self, payload: dict, stream: bool = False):
+        """POST payload with retries until a 200 response (returned unread when streaming)."""
+        model = payload["model"]
+        # Ask OpenRouter to report token usage and cost in the response
+        payload = {**payload, "usage": {"include": True}}
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if self.limiter is not None:
+                self.limiter.acquire(payload)
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise OpenRouterError(None, str(e)) from e
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            if response.status_code == 200:
+                if self.limiter is not None:
+                    self.limiter.succeeded(model)
+                return response
+
+            delay = self._retry_after(response)
+            if response.status_code == 429 and self.limiter is not None:
+                # The limiter slows this model down and holds its queue until Retry-After
+                self.limiter.rate_limited(model, delay if delay is not None else self._backoff_delay(attempt))
+                if not last_attempt:
+                    response.close()
+                    continue
+
+            if response.status_code in RETRY_STATUS and not last_attempt:
+                response.close()
+                time.sleep(min(self.max_backoff, delay) if delay is not None else self._backoff_delay(attempt))
+                continue
+
+            raise OpenRouterError(response.status_code, response.text)
+
+    @staticmethod
+    def _check_error(data: dict):
+        # OpenRouter sometimes reports upstream failures inside a 200 body
+        if "choices" not in data and "error" in data:
+            error = data["error"]
+            raise OpenRouterError(error.get("code"), error.get("message", str(error)))
+
+    def post(self, payload: dict) -> dict:
+        """POST a chat completion payload and return the decoded JSON body."""
+        data = self._send(payload).json()
+        self._check_error(data)
+        return data
+
+    def chat(self, messages, model: str, temperature: float = None, max_tokens: int = None,
+             cache: bool = True, feature: str = None) -> str:
+        """
+        Send chat messages and return the reply text.
+        Replies are served from / stored in the persistent LLM cache unless cache=False
+        (use that for creative, non-deterministic generations) or LLM_CACHE=0.
+        With cache=True, a call identical to one already in flight waits for that
+        call's reply instead of sending its own request (LLM_COALESCE=0 disables this).
+        feature names the calling feature in the metrics.
+        """
+        start = time.perf_counter()
+        payload = {"model": model, "messages": messages}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+
+        use_cache = cache and llm_cache.LLM_CACHE_ENABLED
+        key = llm_cache.request_key(payload) if cache else None
+        if use_cache:
+            cached = llm_cache.get_cache().get(key)
+            if cached is not None:
+                metrics.get_registry().record_call(model, feature, "cached", time.perf_counter() - start)
+                return cached
+
+        if not (cache and LLM_COALESCE):
+            return self._fetch(payload, key if use_cache else None, feature)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            try:
+                return future.result()
+            finally:
+                metrics.get_registry().record_call(model, feature, "coalesced", time.perf_counter() - start)
+
+        try:
+            # The previous leader may have finished between our cache check and now
+            content = llm_cache.get_cache().get(key) if use_cache else None
+            if content is None:
+                content = self._fetch(payload, key if use_cache else None, feature)
+            else:
+                metrics.get_registry().record_call(model, feature, "cached", time.perf_counter() - start)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _fetch(self, payload: dict, cache_key: str = None, feature: str = None) -> str:
+        """POST payload and return the reply text, storing it under cache_key if given."""
+        registry = metrics.get_registry()
+        start = time.perf_counter()
+        try:
+            data = self.post(payload)
+        except BaseException as e:
+            registry.record_call(payload["model"], feature, _status(e), time.perf_counter() - start)
+            raise
+        registry.record_call(payload["model"], feature, "ok", time.perf_counter() - start, data.get("usage"))
+
+        content = data["choices"][0]["message"]["content"]
+        if cache_key is not None:
+            llm_cache.get_cache().put(cache_key, payload["model"], content)
+        return content
+
+    def chat_stream(self, messages, model: str, temperature: float = None, max_tokens: int = None,
+                    cache: bool = True, feature: str = None):
+        """
+        Like chat(), but yields the reply text piece by piece as OpenRouter streams it (SSE).
+        A cached reply is yielded in one piece; a completed stream is stored in the cache.
+        """
+        registry = metrics.get_registry()
+        start = time.perf_counter()
+        payload = {"model": model, "messages": messages}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+
+        use_cache = cache and llm_cache.LLM_CACHE_ENABLED
+        if use_cache:
+            key = llm_cache.request_key(payload)
+            cached = llm_cache.get_cache().get(key)
+            if cached is not None:
+                registry.record_call(model, feature, "cached", time.perf_counter() - start)
+                yield cached
+                return
+
+        try:
+            response = self._send({**payload, "stream": True}, stream=True)
+        except BaseException as e:
+            registry.record_call(model, feature, _status(e), time.perf_counter() - start)
+            raise
+        response.encoding = "utf-8"     # SSE bodies often omit the charset
+        pieces = []
+        usage = None
+        status = "ok"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Skip blank event separators and ":" keep-alive comments
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                self._check_error(event)
+                usage = event.get("usage") or usage
+                # The final event may carry only usage, with no choices
+                choices = event.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        except BaseException as e:
+            status = _status(e)
+            raise
+        finally:
+            response.close()
+            registry.record_call(model, feature, status, time.perf_counter() - start, usage)
+
+        if use_cache:
+            llm_cache.get_cache().put(key, model, "".join(pieces))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenRouterClient:
+    """Return the process-wide OpenRouter client (shared connection pool)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenRouterClient()
+        return _client
+
+
+def fan_out(fn, items, max_workers: int = None):
+    """
+    Call fn(item) for every item concurrently (at most max_workers at a time).
+    Returns a list in input order holding each result, or the exception it raised,
+    so one failed chunk does not throw away the others.
+    """
+    items = list(items)
+    max_workers = max(1, min(max_workers or LLM_CONCURRENCY, len(items) or 1))
+    # Worker threads have no Streamlit context; keep requests attributed to the caller's session
+    session = rate_limiter.current_session_id()
+
+    def safe_call(item):
+        try:
+            with rate_limiter.session_scope(session):
+                return fn(item)
+        except Exception as e:
+            return e
+
+    if max_workers == 1:
+        return [safe_call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm") as pool:
+        return list(pool.map(safe_call, items))
+
+
+def lstrip_stream(pieces):
+    """Drop the leading whitespace of a text stream (str.lstrip on the joined text)."""
+    pieces = iter(pieces)
+    try:
+        for piece in pieces:
+            piece = piece.lstrip()
+            if piece:
+                yield piece
+                break
+        yield from pieces
+    finally:
+        # Stopping early must also stop (and close the connection of) the inner stream
+        if hasattr(pieces, "close"):
+            pieces.close()
+
+
+def raise_if_all_failed(results):
+    """Re-raise the first error when no chunk succeeded."""
+    if results and all(isinstance(r, Exception) for r in results):
+        raise results[0]
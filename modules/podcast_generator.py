@@ -1,16 +1,11 @@
 import os
-import requests
-import uuid
 from gtts import gTTS
-from dotenv import load_dotenv
 from modules.chunker import chunk_text
+from modules import metrics
+from modules.openrouter import get_client
+from modules.workspace import get_workspace
 import re
 
-load_dotenv()
-
-API_KEY = os.getenv("OPENROUTER_API_KEY")
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-
 
 def clean_script(raw_text: str) -> str:
     """
@@ -57,23 +52,9 @@ def clean_script(raw_text: str) -> str:
     return "\n".join(cleaned_lines)
 
 def _call_openrouter(prompt: str, model: str, max_tokens: int = 2000) -> str:
-    """Helper to call OpenRouter API safely."""
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": max_tokens,
-    }
-
-    response = requests.post(API_URL, headers=headers, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"API Error {response.status_code}: {response.text}")
-
-    return response.json()["choices"][0]["message"]["content"]
+    """Helper to call OpenRouter API safely (uncached: every generation should be fresh)."""
+    return get_client().chat([{"role": "user", "content": prompt}], model, max_tokens=max_tokens, cache=False,
+                             feature="podcast")
 
 
 def generate_dialogue_script(
@@ -94,19 +75,20 @@ def generate_dialogue_script(
     num_chunks = max(1, target_words // chunk_size)
 
     scripts = []
-    for i in range(num_chunks):
-        prompt = (
-            f"Podcast script part {i+1}/{num_chunks}.\n\n"
-            f"Write a {style} podcast dialogue between a Host and a Guest "
-            f"on the topic: {topic}. "
-            f"Ensure alternating 'Host:' and 'Guest:' turns. "
-            f"Make it natural and engaging. "
-            f"Approx. {chunk_size} words in this part. "
-            f"Do NOT summarize previous parts; continue fresh dialogue."
-        )
-
-        raw_text = _call_openrouter(prompt, model, max_tokens=chunk_size + 200)
-        scripts.append(clean_script(raw_text))
+    with metrics.track("podcast", chunks=num_chunks):
+        for i in range(num_chunks):
+            prompt = (
+                f"Podcast script part {i+1}/{num_chunks}.\n\n"
+                f"Write a {style} podcast dialogue between a Host and a Guest "
+                f"on the topic: {topic}. "
+                f"Ensure alternating 'Host:' and 'Guest:' turns. "
+                f"Make it natural and engaging. "
+                f"Approx. {chunk_size} words in this part. "
+                f"Do NOT summarize previous parts; continue fresh dialogue."
+            )
+
+            raw_text = _call_openrouter(prompt, model, max_tokens=chunk_size + 200)
+            scripts.append(clean_script(raw_text))
 
     full_script = "\n\n".join(scripts)
 
@@ -170,12 +152,19 @@ def format_pretty_output(script_json: dict) -> str:
 def dialogue_to_audio(dialogue, host_lang="en", guest_lang="en"):
     """
     Convert dialogue into one MP3 audio file.
+    The file is named by its text, so converting the same script again reuses it.
     """
-    os.makedirs("temp", exist_ok=True)
-    filename = f"temp/{uuid.uuid4().hex}_podcast.mp3"
-
+    workspace = get_workspace()
     full_text = " ".join([f"{turn['speaker']}: {turn['text']}" for turn in dialogue])
+    filename = workspace.content_path("podcast", host_lang, full_text, suffix=".mp3")
+    if os.path.exists(filename):
+        workspace.touch(filename)
+        return filename
+
+    tmp_path = workspace.temp_path(".mp3.part")
     tts = gTTS(text=full_text, lang=host_lang, tld="com")
-    tts.save(filename)
+    tts.save(tmp_path)
+    os.replace(tmp_path, filename)
+    workspace.register(filename)
 
     return filename
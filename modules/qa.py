@@ -1,63 +1,115 @@
-import os
-import requests
-from dotenv import load_dotenv
-from modules.chunker import chunk_text
-
-# Load env
-load_dotenv()
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+from modules.chunker import chunk_for_model, estimate_tokens
+from modules import metrics
+from modules.openrouter import get_client, fan_out, raise_if_all_failed, lstrip_stream
 
 DEFAULT_MODEL = "mistralai/mistral-nemo-instruct-2407"
+NOT_FOUND = "Answer not found"
+QUOTES = ' "\'*'      # models sometimes quote or bold the not-found reply
 
 
-def answer_question(question: str, context: str, model: str = DEFAULT_MODEL):
-    """
-    Ask the selected model (via OpenRouter) to answer the question based on context.
-    Handles long context via chunking.
-    """
-    if not question.strip() or not context.strip():
-        return "⚠️ No question or context provided."
-
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    chunks = chunk_text(context, max_len=2500)
-    answers = []
-
-    for idx, chunk in enumerate(chunks, 1):
-        prompt = f"""
+def _qa_prompt(question: str, chunk: str, idx: int, total: int) -> str:
+    return f"""
         You are a Question Answering assistant. 
         Answer the question strictly based on the given context. 
         If the answer is not in the context, reply with: "Answer not found in context."
 
-        Context (part {idx}/{len(chunks)}):
+        Context (part {idx}/{total}):
         {chunk}
 
         Question:
         {question}
         """
 
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.2,
-            "max_tokens": 500
-        }
 
-        response = requests.post(OPENROUTER_URL, headers=headers, json=payload)
-        response.raise_for_status()
+def _is_not_found(reply: str) -> bool:
+    """Whether a chunk's reply is the not-found answer (rather than an answer that mentions it)."""
+    return reply.lstrip(QUOTES).startswith(NOT_FOUND)
 
-        answers.append(response.json()["choices"][0]["message"]["content"].strip())
+
+def answer_question(question: str, context: str, model: str = DEFAULT_MODEL, max_workers: int = None):
+    """
+    Ask the selected model (via OpenRouter) to answer the question based on context.
+    Handles long context via token-budget chunking; chunks are asked concurrently
+    and a failed chunk is skipped rather than failing the answer.
+    """
+    if not question.strip() or not context.strip():
+        return "⚠️ No question or context provided."
+
+    # Fewest chunks that fit the model's context next to the prompt and the answer
+    chunks = chunk_for_model(context, model, prompt_tokens=estimate_tokens(question) + 150, output_tokens=500)
+
+    def ask_chunk(item):
+        idx, chunk = item
+        prompt = _qa_prompt(question, chunk, idx, len(chunks))
+        return get_client().chat(
+            [{"role": "user", "content": prompt}], model, temperature=0.2, max_tokens=500, feature="qa"
+        ).strip()
+
+    with metrics.track("qa", chunks=len(chunks)):
+        results = fan_out(ask_chunk, enumerate(chunks, 1), max_workers)
+        raise_if_all_failed(results)
+    answers = [a for a in results if not isinstance(a, Exception)]
 
     # Merge answers, remove duplicates
-    merged = "\n\n".join([a for a in answers if "Answer not found" not in a])
+    merged = "\n\n".join([a for a in answers if not _is_not_found(a)])
 
     return merged if merged else "❌ Answer not found in transcript."
 
 
+def answer_question_stream(question: str, context: str, model: str = DEFAULT_MODEL):
+    """
+    Streaming answer_question(): yields each chunk's answer as the model writes it.
+    A reply is held back until it can no longer turn out to be "Answer not found",
+    so not-found parts are dropped without ever being shown. A part that fails after
+    some of its answer was shown is followed by a warning.
+    """
+    if not question.strip() or not context.strip():
+        yield "⚠️ No question or context provided."
+        return
+
+    chunks = chunk_for_model(context, model, prompt_tokens=estimate_tokens(question) + 150, output_tokens=500)
+    client = get_client()
+    with metrics.track("qa", chunks=len(chunks)):
+        answered = False
+        failures = []
+
+        for idx, chunk in enumerate(chunks, 1):
+            prompt = _qa_prompt(question, chunk, idx, len(chunks))
+            stream = lstrip_stream(client.chat_stream(
+                [{"role": "user", "content": prompt}], model, temperature=0.2, max_tokens=500, feature="qa"
+            ))
+            held = ""
+            try:
+                for piece in stream:
+                    if held is None:
+                        yield piece
+                        continue
+                    held += piece
+                    if _is_not_found(held):
+                        break
+                    if len(held.lstrip(QUOTES)) >= len(NOT_FOUND):
+                        yield ("\n\n" if answered else "") + held
+                        answered, held = True, None
+            except Exception as e:
+                failures.append(e)
+                if held is None:
+                    # Part of this answer is already on screen
+                    yield f"\n\n⚠️ Part {idx}/{len(chunks)} failed before its answer was complete: {e}"
+                continue
+            finally:
+                stream.close()
+
+            # Short replies never filled the buffer
+            if held and not _is_not_found(held):
+                yield ("\n\n" if answered else "") + held.rstrip()
+                answered = True
+
+        if not answered:
+            if failures and len(failures) == len(chunks):
+                raise failures[0]
+            yield "❌ Answer not found in transcript."
+
+
 def format_pretty_history(history):
     """
     Format full Q&A history for Telegram/Email.
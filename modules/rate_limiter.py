@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from modules.chunker import estimate_tokens
+
+# Process-wide OpenRouter rate limits (per model): requests/min and tokens/min
+RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT", "1") == "1"
+DEFAULT_RPM = float(os.getenv("LLM_RPM", 120))
+DEFAULT_TPM = float(os.getenv("LLM_TPM", 200000))
+DEFAULT_OUTPUT_TOKENS = 500     # reserved when a request sets no max_tokens
+
+# Per-model overrides, e.g. LLM_MODEL_LIMITS='{"mistralai/mistral-7b-instruct:free": [20, 40000]}'
+MODEL_LIMITS = {
+    model: tuple(limits) for model, limits in json.loads(os.getenv("LLM_MODEL_LIMITS", "{}")).items()
+}
+
+# Adaptive rate: halve on 429, recover by a small step per success (AIMD)
+MIN_SCALE = 0.05
+RECOVERY_STEP = 0.02
+
+_session = contextvars.ContextVar("llm_session", default=None)
+
+
+def current_session_id() -> str:
+    """Id of the Streamlit session making the call ("default" outside Streamlit)."""
+    session = _session.get()
+    if session is not None:
+        return session
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx is not None else "default"
+
+
+@contextmanager
+def session_scope(session_id: str):
+    """Attribute calls made in this block (e.g. from worker threads) to session_id."""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def request_tokens(payload: dict) -> int:
+    """Tokens a request may use: estimated prompt plus the reply limit."""
+    prompt = sum(estimate_tokens(str(m.get("content", ""))) for m in payload.get("messages", []))
+    return prompt + (payload.get("max_tokens") or DEFAULT_OUTPUT_TOKENS)
+
+
+class TokenBucket:
+    """Refills at rate_per_min, holding at most one minute's worth."""
+
+    def __init__(self, rate_per_min: float):
+        self.rate_per_min = rate_per_min
+        self.level = rate_per_min
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, scale: float):
+        self.level = min(self.rate_per_min, self.level + (now - self.updated) * self.rate_per_min * scale / 60)
+        self.updated = now
+
+    def delay(self, amount: float, now: float, scale: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        self._refill(now, scale)
+        amount = min(amount, self.rate_per_min)     # an oversized request waits for a full bucket
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / (self.rate_per_min * scale)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.rate_per_min)
+
+
+class ModelLimiter:
+    """
+    Request and token buckets for one model, granting waiting requests
+    round-robin across sessions so one session's fan-out cannot starve the others.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self._waiting = OrderedDict()   # session id -> deque of tickets, in turn order
+        self._cond = threading.Condition()
+
+    def acquire(self, session_id: str, tokens: int):
+        """Block until it is this request's turn and the buckets allow it."""
+        ticket = object()
+        with self._cond:
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            try:
+                while True:
+                    head_session, queue = next(iter(self._waiting.items()))
+                    if queue[0] is not ticket:
+                        self._cond.wait()
+                        continue
+
+                    now = time.monotonic()
+                    delay = max(
+                        self.blocked_until - now,
+                        self.requests.delay(1, now, self.scale),
+                        self.tokens.delay(tokens, now, self.scale),
+                    )
+                    if delay <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return
+                    self._cond.wait(delay)
+            finally:
+                # Granted (or interrupted): leave the queue and pass the turn on
+                queue = self._waiting[session_id]
+                queue.remove(ticket)
+                if queue:
+                    self._waiting.move_to_end(session_id)
+                else:
+                    del self._waiting[session_id]
+                self._cond.notify_all()
+
+    def rate_limited(self, retry_after: float = None):
+        """429 feedback: halve the rate and pause until Retry-After (if given)."""
+        with self._cond:
+            self.scale = max(MIN_SCALE, self.scale / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def succeeded(self):
+        with self._cond:
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale + RECOVERY_STEP)
+
+
+class RateLimiter:
+    """Per-model ModelLimiters, created on first use."""
+
+    def __init__(self, default_rpm: float = DEFAULT_RPM, default_tpm: float = DEFAULT_TPM, limits: dict = None):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.limits = dict(MODEL_LIMITS if limits is None else limits)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model: str) -> ModelLimiter:
+        with self._lock:
+            limiter = self._models.get(model)
+            if limiter is None:
+                rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+                limiter = self._models[model] = ModelLimiter(rpm, tpm)
+            return limiter
+
+    def acquire(self, payload: dict):
+        self.model(payload["model"]).acquire(current_session_id(), request_tokens(payload))
+
+    def rate_limited(self, model: str, retry_after: float = None):
+        self.model(model).rate_limited(retry_after)
+
+    def succeeded(self, model: str):
+        self.model(model).succeeded()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
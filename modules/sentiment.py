@@ -1,74 +1,196 @@
-import os
-import requests
 import json
-from dotenv import load_dotenv
-from modules.chunker import chunk_text
-
-# Load API Key for OpenRouter
-load_dotenv()
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-API_KEY = os.getenv("OPENROUTER_API_KEY")
+from collections import Counter
+from modules.chunker import chunk_text, chunk_for_model, context_window, estimate_tokens, ESTIMATE_MARGIN
+from modules import metrics, llm_cache
+from modules.openrouter import get_client, fan_out, raise_if_all_failed
 
 # Default model for sentiment
 DEFAULT_MODEL = "mistralai/mistral-7b-instruct"
 
+# Batched mode: small chunks, many per request
+BATCH_CHUNK_CHARS = 2000
+BATCH_SIZE = 8
+BATCH_ITEM_TOKENS = 80      # reply budget per chunk (label, score, one-sentence explanation)
+BATCH_RETRIES = 2           # rounds of re-asking for missing or invalid indices
+LABELS = {"POSITIVE", "NEGATIVE", "NEUTRAL"}
+
 
-def analyze_sentiment(text: str, model: str = DEFAULT_MODEL, max_len: int = 2000):
+def analyze_sentiment(text: str, model: str = DEFAULT_MODEL, max_len: int = None, max_workers: int = None,
+                      batched: bool = False, batch_size: int = BATCH_SIZE):
     """
     Analyze sentiment using OpenRouter LLM.
-    Handles long text by chunking automatically.
+    Handles long text by chunking automatically (by the model's token budget,
+    or every max_len characters when max_len is given). Chunks are analyzed
+    concurrently; failed chunks are left out of the aggregate.
+    batched=True packs up to batch_size chunks (of max_len, default 2000 characters)
+    into each request instead of sending one request per chunk.
     Returns structured dict with aggregated label, score, and explanation.
     """
     if not text.strip():
         return {"label": "NEUTRAL", "score": 0.0, "explanation": "No input text provided."}
 
+    if batched:
+        chunks = chunk_text(text, max_len=max_len or BATCH_CHUNK_CHARS)
+        with metrics.track("sentiment", chunks=len(chunks)):
+            return _aggregate(analyze_chunks_batched(chunks, model, batch_size, max_workers))
+
     # Split text into manageable chunks
-    chunks = chunk_text(text, max_len=max_len)
-    results = []
+    if max_len:
+        chunks = chunk_text(text, max_len=max_len)
+    else:
+        chunks = chunk_for_model(text, model, prompt_tokens=100, output_tokens=300)
+
+    with metrics.track("sentiment", chunks=len(chunks)):
+        results = fan_out(lambda item: _analyze_chunk(*item, len(chunks), model), enumerate(chunks, 1), max_workers)
+        raise_if_all_failed(results)
+    return _aggregate([r for r in results if not isinstance(r, Exception)])
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
 
-    for idx, chunk in enumerate(chunks, 1):
-        prompt = f"""
+def _analyze_chunk(idx: int, chunk: str, total: int, model: str):
+    prompt = f"""
         Analyze the sentiment of the following text (English or Arabic).
         Respond in JSON with keys: label (POSITIVE, NEGATIVE, NEUTRAL), score (0-1), and explanation.
 
-        Text (part {idx}/{len(chunks)}):
+        Text (part {idx}/{total}):
         {chunk}
         """
 
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.2,
-            "max_tokens": 300
-        }
+    raw_output = get_client().chat(
+        [{"role": "user", "content": prompt}], model, temperature=0.2, max_tokens=300, feature="sentiment"
+    ).strip()
 
-        response = requests.post(API_URL, headers=headers, json=payload)
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API Error {response.status_code}: {response.text}")
+    try:
+        result = json.loads(raw_output)
+    except Exception:
+        # fallback: wrap raw text
+        result = {"label": "NEUTRAL", "score": 0.0, "explanation": raw_output}
 
-        raw_output = response.json()["choices"][0]["message"]["content"].strip()
+    return result
 
-        try:
-            result = json.loads(raw_output)
-        except Exception:
-            # fallback: wrap raw text
-            result = {"label": "NEUTRAL", "score": 0.0, "explanation": raw_output}
-
-        results.append(result)
 
-    # Aggregate results across chunks
+def _aggregate(results):
+    """Aggregate results across chunks: majority label, mean score, joined explanations."""
     if len(results) == 1:
         return results[0]
 
-    from collections import Counter
     avg_score = sum(r.get("score", 0.0) for r in results) / len(results)
     labels = [r.get("label", "NEUTRAL").upper() for r in results]
     explanation = "\n\n".join(r.get("explanation", "") for r in results)
     majority_label = Counter(labels).most_common(1)[0][0]
 
     return {"label": majority_label, "score": avg_score, "explanation": explanation}
+
+
+# =======================
+# Batched mode
+# =======================
+
+def _batch_prompt(items) -> str:
+    texts = "\n\n".join(f"[{idx}]\n{chunk}" for idx, chunk in items)
+    indices = ", ".join(str(idx) for idx, _ in items)
+    return f"""
+        Analyze the sentiment of each numbered text below (English or Arabic).
+        Respond with only a JSON array of {len(items)} objects, one per text (indices {indices}), with keys:
+        index, label (POSITIVE, NEGATIVE, NEUTRAL), score (0-1), and explanation (one short sentence).
+
+        {texts}
+        """
+
+
+def _pack(items, model: str, batch_size: int):
+    """Group (index, chunk) items into batches that fit batch_size and the model's context."""
+    budget = int(context_window(model) * ESTIMATE_MARGIN) - 150
+    batches, batch, used = [], [], 0
+    for idx, chunk in items:
+        cost = estimate_tokens(chunk) + BATCH_ITEM_TOKENS + 10
+        if batch and (len(batch) >= batch_size or used + cost > budget):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((idx, chunk))
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _parse_batch(raw_output: str, expected):
+    """Valid {index: result} entries of a JSON-array reply; anything malformed is left out."""
+    start, end = raw_output.find("["), raw_output.rfind("]")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        items = json.loads(raw_output[start:end + 1])
+    except ValueError:
+        return {}
+
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("index"))
+            score = float(item.get("score"))
+        except (TypeError, ValueError):
+            continue
+        label = str(item.get("label", "")).upper()
+        if idx in expected and label in LABELS and 0.0 <= score <= 1.0:
+            parsed[idx] = {"label": label, "score": score, "explanation": str(item.get("explanation", ""))}
+    return parsed
+
+
+def _item_key(chunk: str, model: str) -> str:
+    """LLM cache key of one chunk's validated result from a batched reply."""
+    return llm_cache.request_key({
+        "model": model, "messages": [{"role": "sentiment-item", "content": chunk}],
+        "temperature": 0.2, "max_tokens": BATCH_ITEM_TOKENS,
+    })
+
+
+def analyze_chunks_batched(chunks, model: str = DEFAULT_MODEL, batch_size: int = BATCH_SIZE,
+                           max_workers: int = None):
+    """
+    Per-chunk sentiment results (in chunk order) using few requests: chunks are packed
+    into JSON-array prompts, the reply is validated, and only missing or invalid indices
+    are asked again. Chunks still missing after BATCH_RETRIES rounds are sent one by one.
+    Validated results are cached per chunk, so repeat runs only ask for the rest.
+    """
+    cache = llm_cache.get_cache() if llm_cache.LLM_CACHE_ENABLED else None
+    results = {}
+    if cache is not None:
+        for idx, chunk in enumerate(chunks, 1):
+            cached = cache.get(_item_key(chunk, model))
+            if cached is not None:
+                results[idx] = json.loads(cached)
+    pending = [(idx, chunk) for idx, chunk in enumerate(chunks, 1) if idx not in results]
+
+    def ask(batch):
+        # Whole replies are not cached: one may hold invalid items, and a retry must get a fresh reply
+        raw_output = get_client().chat(
+            [{"role": "user", "content": _batch_prompt(batch)}], model,
+            temperature=0.2, max_tokens=BATCH_ITEM_TOKENS * len(batch) + 50, cache=False, feature="sentiment"
+        )
+        parsed = _parse_batch(raw_output, {idx for idx, _ in batch})
+        if cache is not None:
+            for idx, chunk in batch:
+                if idx in parsed:
+                    cache.put(_item_key(chunk, model), model, json.dumps(parsed[idx], ensure_ascii=False))
+        return parsed
+
+    for _ in range(BATCH_RETRIES + 1):
+        if not pending:
+            break
+        batches = _pack(pending, model, batch_size)
+        for parsed in fan_out(ask, batches, max_workers):
+            if not isinstance(parsed, Exception):
+                results.update(parsed)
+        pending = [(idx, chunk) for idx, chunk in pending if idx not in results]
+
+    if pending:
+        singles = fan_out(lambda item: _analyze_chunk(*item, len(chunks), model), pending, max_workers)
+        if not results:
+            raise_if_all_failed(singles)
+        for (idx, _), result in zip(pending, singles):
+            if not isinstance(result, Exception):
+                results[idx] = result
+
+    return [results[idx] for idx in sorted(results)]
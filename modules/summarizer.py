@@ -1,13 +1,7 @@
-import requests
-import os
-from dotenv import load_dotenv
 from transformers import pipeline
-from modules.chunker import chunk_text
-
-# Load API Key for OpenRouter
-load_dotenv()
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-API_KEY = os.getenv("OPENROUTER_API_KEY")
+from modules.chunker import chunk_by_tokens, chunk_for_model, context_window
+from modules import metrics
+from modules.openrouter import get_client, fan_out, raise_if_all_failed, lstrip_stream
 
 # MODELS CONFIG
 EN_MODEL = "facebook/bart-large-cnn"
@@ -28,9 +22,10 @@ def load_classic_summarizers():
 
 
 def summarize_classic(text: str, lang="en") -> str:
-    """Summarize using BART (EN) or mT5 (AR) with chunking."""
+    """Summarize using BART (EN) or mT5 (AR), chunked to each model's input limit."""
     load_classic_summarizers()
-    chunks = chunk_text(text, max_len=800)
+    model_name, pipe = (AR_MODEL, _ar_summarizer) if lang == "ar" else (EN_MODEL, _en_summarizer)
+    chunks = chunk_by_tokens(text, context_window(model_name) - 16, tokenizer=pipe.tokenizer)
 
     summaries = []
     for ch in chunks:
@@ -43,35 +38,51 @@ def summarize_classic(text: str, lang="en") -> str:
     return "\n".join([f"- {s}" for s in summaries])
 
 
-def summarize_llm(text: str, lang="en", model: str = "mistralai/mistral-7b-instruct", max_length: int = 500) -> str:
-    """Summarize using OpenRouter LLM with chunking."""
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
+def _summary_messages(chunk: str, lang: str):
+    return [
+        {"role": "system", "content": f"You are a helpful assistant that summarizes {lang.upper()} text into clear bullet points."},
+        {"role": "user", "content": f"Summarize this:\n\n{chunk}"}
+    ]
 
-    chunks = chunk_text(text, max_len=800)
-    summaries = []
 
-    for ch in chunks:
-        messages = [
-            {"role": "system", "content": f"You are a helpful assistant that summarizes {lang.upper()} text into clear bullet points."},
-            {"role": "user", "content": f"Summarize this:\n\n{ch}"}
-        ]
-        payload = {
-            "model": model,
-            "messages": messages,
-            "max_tokens": max_length
-        }
-        response = requests.post(API_URL, headers=headers, json=payload)
-        if response.status_code != 200:
-            raise Exception(f"API Error {response.status_code}: {response.text}")
-
-        summaries.append(response.json()["choices"][0]["message"]["content"].strip())
+def summarize_llm(text: str, lang="en", model: str = "mistralai/mistral-7b-instruct", max_length: int = 500,
+                  max_workers: int = None) -> str:
+    """Summarize using OpenRouter LLM with chunking (chunks are summarized concurrently)."""
+    chunks = chunk_for_model(text, model, prompt_tokens=60, output_tokens=max_length)
+
+    def summarize_chunk(ch):
+        return get_client().chat(_summary_messages(ch, lang), model, max_tokens=max_length, feature="summarizer").strip()
+
+    with metrics.track("summarizer", chunks=len(chunks)):
+        results = fan_out(summarize_chunk, chunks, max_workers)
+        raise_if_all_failed(results)
+    summaries = [
+        f"⚠️ Part {idx} could not be summarized: {s}" if isinstance(s, Exception) else s
+        for idx, s in enumerate(results, 1)
+    ]
 
     return "\n".join([f"- {s}" for s in summaries])
 
 
+def summarize_llm_stream(text: str, lang="en", model: str = "mistralai/mistral-7b-instruct", max_length: int = 500):
+    """
+    Streaming summarize_llm(): yields the summary text as the model writes it,
+    one bullet per chunk (chunks are summarized in order, not concurrently).
+    text may be a Transcript, which is chunked on its segment boundaries.
+    """
+    chunks = chunk_for_model(text, model, prompt_tokens=60, output_tokens=max_length)
+    client = get_client()
+    with metrics.track("summarizer", chunks=len(chunks)):
+        for idx, ch in enumerate(chunks, 1):
+            yield "- " if idx == 1 else "\n- "
+            try:
+                yield from lstrip_stream(client.chat_stream(_summary_messages(ch, lang), model, max_tokens=max_length,
+                                                            feature="summarizer"))
+            except Exception as e:
+                if len(chunks) == 1:
+                    raise
+                yield f"⚠️ Part {idx} could not be summarized: {e}"
+
 
 def summarize_text(text: str, lang="en", mode="classic") -> str:
     """
@@ -1,47 +1,395 @@
 import whisper
 import os
-import tempfile
 import subprocess
-from pydub import AudioSegment
+import threading
+import wave
+import time
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from modules import vad, transcript_cache
+from modules.transcript import Transcript
 
-model = whisper.load_model("small")
+SAMPLE_RATE = 16000
 
-def transcribe(audio_path: str, lang="auto", chunk_sec=180):
+# Whisper model registry
+MODEL_SIZES = ["tiny", "base", "small", "medium"]
+DEFAULT_MODEL_SIZE = os.getenv("WHISPER_MODEL", "small")
+MODEL_IDLE_SEC = int(os.getenv("WHISPER_IDLE_SEC", 900))
+
+_models = {}        # size -> loaded model (shared by every caller in the process)
+_last_used = {}     # size -> last time the model was requested or released
+_in_use = {}        # size -> callers currently transcribing with the model
+_models_lock = threading.Lock()
+_janitor = None
+
+# Parallel (process pool) transcription for CPU-only boxes; 0/1 = in-process
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", 0))
+TRANSCRIBE_THREADS = int(os.getenv("TRANSCRIBE_THREADS", 0))
+
+_pools = {}         # (workers, model size, threads per worker) -> process pool
+_pool_lock = threading.Lock()
+
+# Shared cross-file batching queue (see modules/transcription_queue.py)
+TRANSCRIBE_BATCHED = os.getenv("TRANSCRIBE_BATCHED", "0") == "1"
+
+
+def get_model(size: str = None):
     """
-    Transcribe long audio by splitting into chunks and merging results.
+    Return the Whisper model of the given size, loading it on first use.
+    Loaded models are shared singletons and get evicted after MODEL_IDLE_SEC.
+    """
+    size = size or DEFAULT_MODEL_SIZE
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unsupported Whisper model size: {size} (choose from {MODEL_SIZES})")
+
+    with _models_lock:
+        if size not in _models:
+            _models[size] = whisper.load_model(size)
+            _start_janitor()
+        _last_used[size] = time.monotonic()
+        return _models[size]
+
+
+@contextmanager
+def using_model(size: str = None):
+    """
+    get_model() for the duration of a with-block: the model is not evicted while
+    any caller is inside one, and its idle clock restarts when the last one leaves.
+    """
+    size = size or DEFAULT_MODEL_SIZE
+    model = get_model(size)
+    with _models_lock:
+        _in_use[size] = _in_use.get(size, 0) + 1
+    try:
+        yield model
+    finally:
+        with _models_lock:
+            _in_use[size] -= 1
+            if not _in_use[size]:
+                del _in_use[size]
+            _last_used[size] = time.monotonic()
+
+
+def unload_model(size: str):
+    """Drop a loaded model so its memory can be reclaimed."""
+    with _models_lock:
+        _models.pop(size, None)
+        _last_used.pop(size, None)
+
+
+def evict_idle_models(max_idle_sec: int = None):
+    """Unload every model not in use and not requested for max_idle_sec seconds."""
+    max_idle_sec = MODEL_IDLE_SEC if max_idle_sec is None else max_idle_sec
+    now = time.monotonic()
+    with _models_lock:
+        idle = [s for s, t in _last_used.items() if now - t > max_idle_sec and s not in _in_use]
+        for size in idle:
+            _models.pop(size, None)
+            _last_used.pop(size, None)
+    return idle
+
+
+def _start_janitor():
+    """Start the background thread that evicts idle models (caller holds the lock)."""
+    global _janitor
+    if _janitor is not None or MODEL_IDLE_SEC <= 0:
+        return
+
+    def sweep():
+        while True:
+            time.sleep(max(30, MODEL_IDLE_SEC // 4))
+            evict_idle_models()
+
+    _janitor = threading.Thread(target=sweep, name="whisper-janitor", daemon=True)
+    _janitor.start()
+
+
+def _init_worker(model_size: str, threads: int):
+    """Pin torch threads and load this worker's own copy of the model."""
+    if threads:
+        torch.set_num_threads(threads)
+    get_model(model_size)
+
+
+def _segments(result: dict):
+    """Keep Whisper's segment timestamps as compact (start, end, text) tuples."""
+    segments = [(seg["start"], seg["end"], seg["text"].strip()) for seg in result.get("segments", [])]
+    if not segments and result["text"].strip():
+        segments = [(0.0, 0.0, result["text"].strip())]
+    return segments
+
+
+def _transcribe_chunk(chunk: np.ndarray, model_size: str, options: dict):
+    """Run inside a pool worker: transcribe one chunk with the worker's model."""
+    with using_model(model_size) as model:
+        return _segments(model.transcribe(chunk, **options, verbose=False))
+
+
+def _language_windows(audio: np.ndarray, spans, samples: int = 3):
+    """Pick up to `samples` 30s speech windows spread evenly across the file."""
+    window = whisper.audio.N_SAMPLES
+    spans = spans or [(0, len(audio))]
+    picks = np.linspace(0, len(spans) - 1, num=min(samples, len(spans))).round().astype(int)
+    return [audio[spans[i][0]:min(spans[i][1], spans[i][0] + window)] for i in sorted(set(picks))]
+
+
+def _detect_language(windows, model_size: str = None):
+    """Average Whisper's language probabilities over the windows; returns (language, probability)."""
+    totals = {}
+    with using_model(model_size) as model:
+        for window in windows:
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(window), model.dims.n_mels).to(model.device)
+            _, probs = model.detect_language(mel)
+            for code, p in probs.items():
+                totals[code] = totals.get(code, 0.0) + p
+    if not totals:
+        return None, 0.0
+    language = max(totals, key=totals.get)
+    return language, totals[language] / len(windows)
+
+
+def detect_language(audio: np.ndarray, model_size: str = None, spans=None):
+    """
+    Detect the spoken language once for a whole file from a few representative
+    speech windows. Returns (language code, probability).
+    """
+    return _detect_language(_language_windows(audio, spans), model_size)
+
+
+def get_pool(workers: int, model_size: str = None, threads_per_worker: int = None):
+    """
+    Return the shared process pool for these settings, creating it on first use.
+    Each worker holds its own Whisper model and uses threads_per_worker torch threads.
+    Pools are kept per settings (never replaced), so a session asking for other
+    settings cannot cancel the chunks another session has in flight.
+    """
+    model_size = model_size or DEFAULT_MODEL_SIZE
+    if not threads_per_worker:
+        threads_per_worker = TRANSCRIBE_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+    key = (workers, model_size, threads_per_worker)
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_size, threads_per_worker),
+            )
+        return pool
+
+
+def shutdown_pool():
+    """Stop every pool's worker processes (and free their models)."""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _read_pcm_wav(audio_path: str):
+    """Read a 16kHz mono 16-bit WAV without ffmpeg; returns None for anything else."""
+    try:
+        with wave.open(audio_path, "rb") as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+                return None
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError, OSError):
+        return None
+    audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32)
+    audio /= 32768.0
+    return audio
+
+
+def load_audio(audio_path: str) -> np.ndarray:
+    """
+    Decode any audio/video file into one 16kHz mono float32 array.
+    ffmpeg writes raw PCM to a pipe, so nothing touches the disk.
+    Files that are already 16kHz mono PCM WAV (e.g. from downloader) are read directly.
+    """
+    audio = _read_pcm_wav(audio_path)
+    if audio is not None:
+        return audio
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", audio_path,
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Drain stderr alongside stdout: a damaged file can log enough errors to fill
+    # the stderr pipe, which would block ffmpeg (and us) forever
+    stderr = []
+    drain = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    drain.start()
+
+    # Read into a bytearray so the final array is writable (torch warns otherwise)
+    buffer = bytearray()
+    while True:
+        block = proc.stdout.read(1 << 20)
+        if not block:
+            break
+        buffer += block
+
+    drain.join()
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {audio_path}: {b''.join(stderr).decode(errors='ignore')}")
+
+    usable = len(buffer) - len(buffer) % 4
+    return np.frombuffer(buffer, dtype=np.float32, count=usable // 4)
+
+
+def split_audio(audio: np.ndarray, chunk_sec=180, use_vad=True):
+    """
+    Return (start, end) sample spans to transcribe.
+    With use_vad, silence is dropped and chunks of up to chunk_sec are cut at pauses;
+    otherwise the audio is split every chunk_sec seconds.
+    """
+    if use_vad:
+        return vad.segment(audio, max_chunk_sec=chunk_sec, sample_rate=SAMPLE_RATE)
+    step = chunk_sec * SAMPLE_RATE
+    return [(i, min(i + step, len(audio))) for i in range(0, len(audio), step)]
+
+
+def transcribe_stream(audio_path: str, lang="auto", chunk_sec=180, model_size: str = None,
+                      workers: int = None, threads_per_worker: int = None, use_vad: bool = True,
+                      use_cache: bool = True, batched: bool = None):
+    """
+    Generator version of transcribe(): yields one dict per chunk as soon as it is decoded,
+    with keys "text", "start", "end" (offsets in seconds from the start of the file)
+    and "segments" (Whisper segments with absolute start/end times).
+    Finished transcripts are cached on disk by audio content, language and model size.
+    batched sends 30s windows through the shared cross-file queue (defaults to TRANSCRIBE_BATCHED).
     """
     if not os.path.exists(audio_path):
         raise FileNotFoundError(audio_path)
 
-    # Convert to wav (16kHz mono PCM)
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
-        tmp_path = tmp_wav.name
-    subprocess.run([
-        "ffmpeg", "-y", "-i", audio_path,
-        "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", tmp_path
-    ], check=True)
+    batched = TRANSCRIBE_BATCHED if batched is None else batched
+    key = None
+    if use_cache:
+        key = transcript_cache.cache_key(audio_path, lang, model_size or DEFAULT_MODEL_SIZE,
+                                         chunk_sec=chunk_sec, use_vad=use_vad, batched=batched)
+        cached = transcript_cache.get(key)
+        if cached is not None:
+            yield from cached
+            return
 
-    # Load audio
-    audio = AudioSegment.from_wav(tmp_path)
-    os.remove(tmp_path)
+    if batched:
+        stream = _transcribe_batched(audio_path, lang, model_size, use_vad)
+    else:
+        stream = _transcribe_parts(audio_path, lang, chunk_sec, model_size, workers,
+                                   threads_per_worker, use_vad)
 
-    # Split into chunks
-    chunks = []
-    for i in range(0, len(audio), chunk_sec * 1000):  # ms
-        chunks.append(audio[i:i + chunk_sec * 1000])
+    parts = []
+    for part in stream:
+        parts.append(part)
+        yield part
+
+    if key is not None:
+        transcript_cache.put(key, parts)
+
+
+def _transcribe_parts(audio_path, lang, chunk_sec, model_size, workers, threads_per_worker, use_vad):
+    """Decode, split and transcribe audio_path, yielding one part per chunk."""
+    workers = TRANSCRIBE_WORKERS if workers is None else workers
+    audio = load_audio(audio_path)
+
+    # Split into chunks (zero-copy views of the decoded buffer)
+    spans = split_audio(audio, chunk_sec, use_vad)
+    chunks = [audio[start:end] for start, end in spans]
+
+    parallel = workers > 1 and len(chunks) > 1
+    pool = get_pool(workers, model_size, threads_per_worker) if parallel else None
+
+    # Detect the language once and pin it for every chunk
+    probability = 1.0
+    if lang == "auto" and chunks:
+        windows = _language_windows(audio, spans)
+        if pool is not None:
+            lang, probability = pool.submit(_detect_language, windows, model_size).result()
+        else:
+            lang, probability = _detect_language(windows, model_size)
 
-    full_text = []
     options = {}
-    if lang != "auto":
+    if lang and lang != "auto":
         options["language"] = lang
 
-    for idx, chunk in enumerate(chunks):
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as c_wav:
-            c_path = c_wav.name
-        chunk.export(c_path, format="wav")
+    if parallel:
+        # map() yields results in chunk order
+        n = len(chunks)
+        results = pool.map(_transcribe_chunk, chunks, [model_size] * n, [options] * n)
+    else:
+        results = _transcribe_local(chunks, model_size, options)
+
+    for (start, end), segments in zip(spans, results):
+        offset = start / SAMPLE_RATE
+        yield {
+            "text": " ".join(t for _, _, t in segments if t),
+            "start": offset,
+            "end": end / SAMPLE_RATE,
+            "segments": [{"start": offset + s, "end": offset + e, "text": t} for s, e, t in segments],
+            "language": options.get("language"),
+            "language_probability": probability,
+        }
+
+
+def _transcribe_local(chunks, model_size, options):
+    """Transcribe chunks in-process, holding the model for as long as the stream is consumed."""
+    with using_model(model_size) as model:
+        for chunk in chunks:
+            yield _segments(model.transcribe(chunk, **options, verbose=False))
+
 
-        result = model.transcribe(c_path, **options, verbose=False)
-        full_text.append(result["text"])
-        os.remove(c_path)
+def _transcribe_batched(audio_path, lang, model_size, use_vad):
+    """Submit the file to the shared batching queue and yield its windows in order."""
+    from modules.transcription_queue import get_queue
 
-    return " ".join(full_text).strip()
+    audio = load_audio(audio_path)
+    probability = 1.0
+    if lang == "auto":
+        lang, probability = detect_language(audio, model_size,
+                                            spans=vad.speech_regions(audio) if use_vad else None)
+
+    futures = get_queue().submit(audio, language=lang, model_size=model_size, use_vad=use_vad)
+    for future in futures:
+        part = future.result()
+        yield {**part, "language": lang, "language_probability": probability}
+
+
+def transcribe_segments(audio_path: str, lang="auto", **options) -> Transcript:
+    """
+    Transcribe audio_path and keep Whisper's timestamps.
+    Accepts the same options as transcribe(); returns a Transcript whose
+    language/language_probability hold the (detected) language.
+    """
+    transcript = Transcript(language=None if lang == "auto" else lang)
+    for part in transcribe_stream(audio_path, lang=lang, **options):
+        if part.get("language"):
+            transcript.language = part["language"]
+            transcript.language_probability = part.get("language_probability", 1.0)
+        chunk = transcript.add_chunk(part["start"])
+        # Cache entries written before segments were kept hold the chunk text only
+        for seg in part.get("segments") or [{"start": part["start"], "end": part["end"], "text": part["text"]}]:
+            transcript.append(seg["start"], seg["end"], seg["text"], chunk)
+    return transcript
+
+
+def transcribe(audio_path: str, lang="auto", chunk_sec=180, model_size: str = None,
+               workers: int = None, threads_per_worker: int = None, use_vad: bool = True,
+               use_cache: bool = True, batched: bool = None):
+    """
+    Transcribe long audio by splitting into chunks and merging results.
+    model_size picks the Whisper model (tiny/base/small/medium); defaults to WHISPER_MODEL.
+    workers > 1 transcribes chunks in parallel on a process pool (defaults to TRANSCRIBE_WORKERS).
+    use_vad skips silence and cuts chunks at pauses instead of every chunk_sec seconds.
+    batched shares 30s-window batches with other concurrent callers instead.
+    """
+    transcript = transcribe_segments(audio_path, lang=lang, chunk_sec=chunk_sec, model_size=model_size,
+                                     workers=workers, threads_per_worker=threads_per_worker,
+                                     use_vad=use_vad, use_cache=use_cache, batched=batched)
+    return transcript.text
@@ -0,0 +1,104 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class Transcript:
+    """
+    Timestamped Whisper segments stored column-wise:
+    start/end times (seconds), segment text and the chunk each segment came from.
+    Segments are kept in time order, so time-range slicing is a binary search.
+    """
+
+    def __init__(self, language: str = None, language_probability: float = 1.0):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.texts = []
+        self.chunk_ids = array("i")
+        self.chunk_offsets = array("d")     # start time of every chunk
+        self.language = language
+        self.language_probability = language_probability
+
+    def add_chunk(self, offset: float) -> int:
+        """Register a new chunk starting at offset seconds and return its index."""
+        self.chunk_offsets.append(offset)
+        return len(self.chunk_offsets) - 1
+
+    def append(self, start: float, end: float, text: str, chunk: int = 0):
+        """Add one segment (absolute times in seconds)."""
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text.strip())
+        self.chunk_ids.append(chunk)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for i in range(len(self.texts)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> dict:
+        return {"start": self.starts[i], "end": self.ends[i], "text": self.texts[i], "chunk": self.chunk_ids[i]}
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def text(self) -> str:
+        """The full transcript as one string (segments joined by spaces)."""
+        return " ".join(t for t in self.texts if t)
+
+    @property
+    def duration(self) -> float:
+        return self.ends[-1] if len(self) else 0.0
+
+    def slice(self, start: float, end: float) -> "Transcript":
+        """Return the segments overlapping [start, end) seconds as a new Transcript."""
+        i = bisect_right(self.ends, start)
+        j = bisect_left(self.starts, end)
+        return self._subset(i, max(i, j))
+
+    def _subset(self, i: int, j: int) -> "Transcript":
+        sub = Transcript(language=self.language, language_probability=self.language_probability)
+        sub.starts = self.starts[i:j]
+        sub.ends = self.ends[i:j]
+        sub.texts = self.texts[i:j]
+        sub.chunk_ids = self.chunk_ids[i:j]
+        sub.chunk_offsets = self.chunk_offsets
+        return sub
+
+    def split(self, max_len: int):
+        """
+        Pack consecutive segments into sub-transcripts of at most max_len characters,
+        always cutting on segment boundaries.
+        """
+        pieces, first, length = [], 0, 0
+        for i, text in enumerate(self.texts):
+            if length and length + len(text) + 1 > max_len:
+                pieces.append(self._subset(first, i))
+                first, length = i, 0
+            length += len(text) + 1
+        if first < len(self):
+            pieces.append(self._subset(first, len(self)))
+        return pieces
+
+    def to_dict(self) -> dict:
+        return {
+            "language": self.language,
+            "language_probability": self.language_probability,
+            "starts": list(self.starts),
+            "ends": list(self.ends),
+            "texts": self.texts,
+            "chunk_ids": list(self.chunk_ids),
+            "chunk_offsets": list(self.chunk_offsets),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Transcript":
+        transcript = cls(language=data.get("language"), language_probability=data.get("language_probability", 1.0))
+        transcript.starts = array("d", data.get("starts", []))
+        transcript.ends = array("d", data.get("ends", []))
+        transcript.texts = list(data.get("texts", []))
+        transcript.chunk_ids = array("i", data.get("chunk_ids", []))
+        transcript.chunk_offsets = array("d", data.get("chunk_offsets", []))
+        return transcript
@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import threading
+import uuid
+from modules import workspace
+
+# On-disk transcript cache shared by every page, session and restart
+CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join("cache", "transcripts"))
+CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MB", 200))
+
+_digests = {}       # (path, size, version) -> sha256, so re-hashing the same file is free
+_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file content, read in 1 MB blocks."""
+    stat = os.stat(path)
+    if workspace.get_workspace().contains(path):
+        # Workspace files are only ever swapped in whole (os.replace), and their mtime
+        # moves on every touch(), so the inode tells their versions apart instead
+        version = (stat.st_dev, stat.st_ino)
+    else:
+        version = stat.st_mtime_ns
+    memo_key = (os.path.abspath(path), stat.st_size, version)
+    if memo_key in _digests:
+        return _digests[memo_key]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    _digests[memo_key] = sha.hexdigest()
+    return _digests[memo_key]
+
+
+def cache_key(audio_path: str, lang: str, model_size: str, **options) -> str:
+    """Key = audio content hash + language + model size (+ any chunking options)."""
+    extra = json.dumps(options, sort_keys=True)
+    settings = hashlib.sha256(f"{lang}|{model_size}|{extra}".encode()).hexdigest()[:16]
+    return f"{file_digest(audio_path)}-{settings}"
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def get(key: str):
+    """Return the cached entry for key (or None) and mark it as recently used."""
+    path = _path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def put(key: str, entry):
+    """Store entry atomically, then evict old entries beyond CACHE_MAX_MB."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = os.path.join(CACHE_DIR, f".{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, _path(key))
+    evict()
+
+
+def evict(max_bytes: int = None):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    max_bytes = CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    with _lock:
+        try:
+            names = [n for n in os.listdir(CACHE_DIR) if n.endswith(".json")]
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+                total -= size
+            except OSError:
+                pass
+
+
+def clear():
+    """Remove every cached transcript."""
+    evict(max_bytes=0)
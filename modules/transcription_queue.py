@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import torch
+import whisper
+from modules import vad
+from modules.transcriber import using_model, SAMPLE_RATE
+
+# Shared batched decoding: 30s windows from several files go through one forward pass
+BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", 8))
+BATCH_WAIT_MS = int(os.getenv("WHISPER_BATCH_WAIT_MS", 50))
+WINDOW_SEC = whisper.audio.CHUNK_LENGTH
+
+
+class _Job:
+    """One submitted file: its pending windows and one future per window."""
+
+    def __init__(self, audio: np.ndarray, spans, model_size: str, language: str):
+        self.audio = audio
+        self.spans = list(spans)
+        self.key = (model_size, language)
+        self.futures = [Future() for _ in self.spans]
+        self.next = 0       # index of the next window to decode
+
+    def has_pending(self) -> bool:
+        return self.next < len(self.spans) and not self.futures[self.next].done()
+
+    def fail(self, error: Exception):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+class TranscriptionQueue:
+    """
+    Process-wide queue that batches 30s windows from every pending file
+    into one whisper.decode() call and hands each result back to its caller.
+    Windows are taken round-robin across files, so one long file cannot starve the rest.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, max_wait_ms: int = BATCH_WAIT_MS):
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._jobs = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, audio: np.ndarray, language: str = None, model_size: str = None, use_vad: bool = True):
+        """
+        Queue a 16kHz mono array for transcription.
+        Returns one Future per window, in time order; each resolves to a part dict
+        ({"text", "start", "end", "segments"}) like transcriber.transcribe_stream yields.
+        """
+        if use_vad:
+            spans = vad.segment(audio, max_chunk_sec=WINDOW_SEC, sample_rate=SAMPLE_RATE)
+        else:
+            step = WINDOW_SEC * SAMPLE_RATE
+            spans = [(i, min(i + step, len(audio))) for i in range(0, len(audio), step)]
+
+        job = _Job(audio, spans, model_size, language)
+        if not spans:
+            return []
+
+        with self._cond:
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.futures
+
+    def _pending_windows(self) -> int:
+        return sum(len(job.spans) - job.next for job in self._jobs)
+
+    def _next_batch(self):
+        """Take up to batch_size windows sharing one (model, language), round-robin across files."""
+        self._jobs = [job for job in self._jobs if job.has_pending()]
+        if not self._jobs:
+            return []
+
+        key = self._jobs[0].key
+        batch = []
+        while len(batch) < self.batch_size:
+            took = False
+            for job in self._jobs:
+                if job.key == key and job.has_pending() and len(batch) < self.batch_size:
+                    batch.append((job, job.next))
+                    job.next += 1
+                    took = True
+            if not took:
+                break
+
+        # Rotate so the next batch starts with another file
+        self._jobs.append(self._jobs.pop(0))
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(job.has_pending() for job in self._jobs):
+                    self._cond.wait()
+                # Give other sessions a moment to add windows to this batch
+                deadline = time.monotonic() + self.max_wait
+                while self._pending_windows() < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._next_batch()
+
+            if batch:
+                self._decode(batch)
+
+    def _decode(self, batch):
+        model_size, language = batch[0][0].key
+        try:
+            with using_model(model_size) as model:
+                mels = torch.stack([
+                    whisper.log_mel_spectrogram(
+                        whisper.pad_or_trim(job.audio[slice(*job.spans[i])]), model.dims.n_mels
+                    )
+                    for job, i in batch
+                ]).to(model.device)
+                options = whisper.DecodingOptions(
+                    language=language, without_timestamps=True, fp16=model.device.type == "cuda"
+                )
+                results = whisper.decode(model, mels, options)
+        except Exception as e:
+            for job, _ in batch:
+                job.fail(e)
+            return
+
+        for (job, i), result in zip(batch, results):
+            start, end = job.spans[i][0] / SAMPLE_RATE, job.spans[i][1] / SAMPLE_RATE
+            text = result.text.strip()
+            job.futures[i].set_result({
+                "text": text,
+                "start": start,
+                "end": end,
+                "segments": [{"start": start, "end": end, "text": text}] if text else [],
+            })
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> TranscriptionQueue:
+    """Return the process-wide transcription queue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = TranscriptionQueue()
+        return _queue
@@ -1,18 +1,16 @@
 import os
-import requests
-from dotenv import load_dotenv
 from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-from modules.chunker import chunk_text
-
-# Load OpenRouter key
-load_dotenv()
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-API_KEY = os.getenv("OPENROUTER_API_KEY")
+from modules.chunker import chunk_by_tokens, chunk_for_model, context_window
+from modules import metrics
+from modules.openrouter import get_client, fan_out, raise_if_all_failed, lstrip_stream
 
 # MODELS CONFIG
 EN_AR_MODEL = "Helsinki-NLP/opus-mt-en-ar"
 AR_EN_MODEL = "Helsinki-NLP/opus-mt-ar-en"
 
+# LLM translation output limit; the output grows with the input, so chunks get half of it
+TRANSLATION_MAX_TOKENS = 2000
+
 # Lazy init
 _en_ar = None
 _ar_en = None
@@ -45,7 +43,8 @@ def translate_classic(text: str, target_lang="en") -> str:
         return ""
 
     load_classic_models()
-    chunks = chunk_text(text, max_len=200)
+    model_name, pipe = (EN_AR_MODEL, _en_ar) if target_lang == "ar" else (AR_EN_MODEL, _ar_en)
+    chunks = chunk_by_tokens(text, context_window(model_name) // 2, tokenizer=pipe.tokenizer)
     outputs = []
 
     for ch in chunks:
@@ -60,34 +59,64 @@ def translate_classic(text: str, target_lang="en") -> str:
     return "\n".join(outputs)
 
 
-def translate_llm(text: str, target_lang="en", model="mistralai/mistral-7b-instruct") -> str:
-    """LLM translation using OpenRouter + chunking."""
+def _translation_messages(chunk: str, target_lang: str):
+    return [
+        {"role": "system", "content": f"You are a professional translator. Translate to {target_lang.upper()} with good formatting."},
+        {"role": "user", "content": chunk}
+    ]
+
+
+def translate_llm(text: str, target_lang="en", model="mistralai/mistral-7b-instruct", max_workers: int = None) -> str:
+    """LLM translation using OpenRouter + chunking (chunks are translated concurrently)."""
     if not text.strip():
         return ""
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    chunks = chunk_text(text, max_len=300)
-    outputs = []
+    chunks = chunk_for_model(text, model, prompt_tokens=60, output_tokens=TRANSLATION_MAX_TOKENS,
+                             max_chunk_tokens=TRANSLATION_MAX_TOKENS // 2)
 
-    for ch in chunks:
-        messages = [
-            {"role": "system", "content": f"You are a professional translator. Translate to {target_lang.upper()} with good formatting."},
-            {"role": "user", "content": ch}
-        ]
-        payload = {"model": model, "messages": messages, "max_tokens": 800}
-        resp = requests.post(API_URL, headers=headers, json=payload)
-        if resp.status_code != 200:
-            raise Exception(f"API Error {resp.status_code}: {resp.text}")
-        outputs.append(resp.json()["choices"][0]["message"]["content"].strip())
+    def translate_chunk(ch):
+        return get_client().chat(_translation_messages(ch, target_lang), model, max_tokens=TRANSLATION_MAX_TOKENS,
+                                 feature="translation").strip()
+
+    with metrics.track("translation", chunks=len(chunks)):
+        results = fan_out(translate_chunk, chunks, max_workers)
+        raise_if_all_failed(results)
+    outputs = [
+        f"⚠️ Part {idx} could not be translated: {out}" if isinstance(out, Exception) else out
+        for idx, out in enumerate(results, 1)
+    ]
 
     return "\n".join(outputs)
 
 
-def translate_text(text: str, target_lang="en", mode="classic") -> str:
-    """Wrapper for translation."""
+def translate_llm_stream(text: str, target_lang="en", model="mistralai/mistral-7b-instruct"):
+    """Streaming translate_llm(): yields the translation as the model writes it, chunk by chunk in order."""
+    if not text.strip():
+        return
+
+    chunks = chunk_for_model(text, model, prompt_tokens=60, output_tokens=TRANSLATION_MAX_TOKENS,
+                             max_chunk_tokens=TRANSLATION_MAX_TOKENS // 2)
+    client = get_client()
+    with metrics.track("translation", chunks=len(chunks)):
+        for idx, ch in enumerate(chunks, 1):
+            if idx > 1:
+                yield "\n"
+            try:
+                yield from lstrip_stream(client.chat_stream(_translation_messages(ch, target_lang), model,
+                                                            max_tokens=TRANSLATION_MAX_TOKENS, feature="translation"))
+            except Exception as e:
+                if len(chunks) == 1:
+                    raise
+                yield f"⚠️ Part {idx} could not be translated: {e}"
+
+
+def translate_text(text: str, target_lang="en", mode="classic", source_lang: str = None) -> str:
+    """
+    Wrapper for translation.
+    source_lang (e.g. the language Whisper detected) skips work when it already matches target_lang.
+    """
+    if source_lang and source_lang == target_lang:
+        return text
     if mode == "llm":
         return translate_llm(text, target_lang=target_lang)
     return translate_classic(text, target_lang=target_lang)
@@ -0,0 +1,106 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+
+def frame_levels(audio: np.ndarray, frame_len: int) -> np.ndarray:
+    """Per-frame energy in dB (no copy of the audio: frames are a reshaped view)."""
+    n_frames = len(audio) // frame_len
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.einsum("ij,ij->i", frames, frames) / frame_len
+    return 10 * np.log10(energy + 1e-10)
+
+
+def _runs(mask: np.ndarray):
+    """Return [start, end) frame index pairs where mask is True."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def speech_regions(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                   threshold_db: float = None, min_speech_ms: int = 250,
+                   min_silence_ms: int = 500, pad_ms: int = 200, levels: np.ndarray = None):
+    """
+    Find speech in a mono float array using an adaptive energy threshold.
+    Returns a list of (start, end) sample offsets; pauses shorter than
+    min_silence_ms stay inside a region, bursts shorter than min_speech_ms are dropped.
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    if levels is None:
+        levels = frame_levels(audio, frame_len)
+    if len(levels) == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    if threshold_db is None:
+        # Sit clearly above the noise floor, but never too far below the loud parts
+        noise_floor = np.percentile(levels, 1)
+        loud = np.percentile(levels, 95)
+        if loud - noise_floor < 10:
+            # No real dynamic range: either all speech or all silence
+            return [(0, len(audio))] if loud > -50 else []
+        threshold_db = max(noise_floor + 0.3 * (loud - noise_floor), loud - 40)
+
+    regions = []
+    min_gap = max(1, min_silence_ms // frame_ms)
+    for start, end in _runs(levels > threshold_db):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    min_len = max(1, min_speech_ms // frame_ms)
+    pad = pad_ms // frame_ms
+    spans = []
+    for start, end in regions:
+        if end - start < min_len:
+            continue
+        start, end = int(max(0, start - pad) * frame_len), int(min(len(audio), (end + pad) * frame_len))
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        else:
+            spans.append((start, end))
+    if spans and spans[-1][1] >= len(levels) * frame_len:
+        spans[-1] = (spans[-1][0], len(audio))
+    return spans
+
+
+def _split_long(start: int, end: int, max_len: int, levels: np.ndarray, frame_len: int):
+    """Cut an over-long region at its quietest frame near each max_len boundary."""
+    pieces = []
+    while end - start > max_len:
+        # Look for the quietest frame in the last quarter of the window
+        lo = (start + max_len * 3 // 4) // frame_len
+        hi = (start + max_len) // frame_len
+        window = levels[lo:hi]
+        cut = (lo + int(np.argmin(window))) * frame_len if len(window) else start + max_len
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def segment(audio: np.ndarray, max_chunk_sec: float = 180, sample_rate: int = SAMPLE_RATE,
+            max_gap_sec: float = 3.0, **vad_options):
+    """
+    Pack speech regions into chunks of at most max_chunk_sec, cutting at pauses.
+    Silence longer than max_gap_sec between regions always starts a new chunk,
+    so it is never sent to the model. Returns (start, end) sample offsets.
+    """
+    frame_len = sample_rate * vad_options.get("frame_ms", FRAME_MS) // 1000
+    levels = frame_levels(audio, frame_len)
+    regions = speech_regions(audio, sample_rate=sample_rate, levels=levels, **vad_options)
+
+    max_len = int(max_chunk_sec * sample_rate)
+    max_gap = int(max_gap_sec * sample_rate)
+    chunks = []
+    for start, end in regions:
+        if chunks and start - chunks[-1][1] <= max_gap and end - chunks[-1][0] <= max_len:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+
+    packed = []
+    for start, end in chunks:
+        packed.extend(_split_long(start, end, max_len, levels, frame_len))
+    return packed
@@ -1,74 +1,53 @@
-import requests
 from gtts import gTTS
-import uuid
 import os
 import math
-from dotenv import load_dotenv
 from modules.chunker import chunk_text
-
-# Load API Key
-load_dotenv()
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
-API_KEY = os.getenv("OPENROUTER_API_KEY")
+from modules import metrics
+from modules.openrouter import get_client, lstrip_stream
+from modules.workspace import get_workspace
 
 
 def _call_openrouter(prompt: str, model: str, max_tokens: int = 600):
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": max_tokens,
-    }
-
-    response = requests.post(API_URL, headers=headers, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"API Error {response.status_code}: {response.text}")
+    # Uncached: every generation should be fresh
+    return get_client().chat([{"role": "user", "content": prompt}], model, max_tokens=max_tokens, cache=False,
+                             feature="video_script").strip()
 
-    return response.json()["choices"][0]["message"]["content"].strip()
 
+def _stream_openrouter(prompt: str, model: str, max_tokens: int = 600):
+    return lstrip_stream(get_client().chat_stream(
+        [{"role": "user", "content": prompt}], model, max_tokens=max_tokens, cache=False, feature="video_script"
+    ))
 
-def generate_structured_video_script(topic: str, style: str = "educational",
-                                     duration: int = 5,
-                                     model: str = "mistralai/mistral-7b-instruct"):
-    """
-    Generate a structured video script with Intro, Body (sequence), Conclusion.
-    Duration in minutes determines total length.
-    """
 
+def _script_plan(topic: str, style: str, duration: int):
+    """Word budgets and prompts for (intro, body parts, conclusion), each as (prompt, max_tokens)."""
     words_per_minute = 150
     target_words = duration * words_per_minute
     body_word_count = int(target_words * 0.7)
     intro_word_count = int(target_words * 0.15)
     conclusion_word_count = target_words - (body_word_count + intro_word_count)
 
-    # Intro
-    intro_prompt = f"Write an engaging introduction for a {style} video script about {topic}. Limit to {intro_word_count} words."
-    intro = _call_openrouter(intro_prompt, model, max_tokens=intro_word_count + 100)
+    intro = (f"Write an engaging introduction for a {style} video script about {topic}. Limit to {intro_word_count} words.",
+             intro_word_count + 100)
 
-    # Body (sequence chunks)
-    body_chunks = []
     chunk_size = 400
     num_chunks = math.ceil(body_word_count / chunk_size)
-
-    for i in range(num_chunks):
-        body_prompt = (
+    body = [
+        (
             f"Write part {i+1} of a {style} video script about {topic}. "
             f"This should be a sequential narrative continuing the topic. "
-            f"Limit to {chunk_size} words."
+            f"Limit to {chunk_size} words.",
+            chunk_size + 100
         )
-        body_chunks.append(_call_openrouter(body_prompt, model, max_tokens=chunk_size + 100))
+        for i in range(num_chunks)
+    ]
 
-    body = " ".join(body_chunks)
+    conclusion = (f"Write a clear conclusion for a {style} video script about {topic}. Limit to {conclusion_word_count} words.",
+                  conclusion_word_count + 100)
+    return intro, body, conclusion
 
-    # Conclusion
-    conclusion_prompt = f"Write a clear conclusion for a {style} video script about {topic}. Limit to {conclusion_word_count} words."
-    conclusion = _call_openrouter(conclusion_prompt, model, max_tokens=conclusion_word_count + 100)
 
-    # Final script
+def _script_json(topic: str, style: str, duration: int, intro: str, body: str, conclusion: str):
     script_text = f"{intro}\n\n{body}\n\n{conclusion}"
 
     # Apply chunking
@@ -91,10 +70,75 @@ def generate_structured_video_script(topic: str, style: str = "educational",
     return script_text, script_json
 
 
+def generate_structured_video_script(topic: str, style: str = "educational",
+                                     duration: int = 5,
+                                     model: str = "mistralai/mistral-7b-instruct"):
+    """
+    Generate a structured video script with Intro, Body (sequence), Conclusion.
+    Duration in minutes determines total length.
+    """
+    (intro_prompt, intro_tokens), body_plan, (conclusion_prompt, conclusion_tokens) = _script_plan(topic, style, duration)
+
+    with metrics.track("video_script", chunks=len(body_plan) + 2):
+        # Intro
+        intro = _call_openrouter(intro_prompt, model, max_tokens=intro_tokens)
+
+        # Body (sequence chunks)
+        body_chunks = [_call_openrouter(prompt, model, max_tokens=tokens) for prompt, tokens in body_plan]
+        body = " ".join(body_chunks)
+
+        # Conclusion
+        conclusion = _call_openrouter(conclusion_prompt, model, max_tokens=conclusion_tokens)
+
+    return _script_json(topic, style, duration, intro, body, conclusion)
+
+
+def generate_structured_video_script_stream(topic: str, style: str = "educational", duration: int = 5,
+                                            model: str = "mistralai/mistral-7b-instruct", result: dict = None):
+    """
+    Streaming generate_structured_video_script(): yields the narration as it is written.
+    When the stream is exhausted, result (if given) holds "script_text" and "script_json".
+    """
+    (intro_prompt, intro_tokens), body_plan, (conclusion_prompt, conclusion_tokens) = _script_plan(topic, style, duration)
+
+    def section(prompt, tokens):
+        pieces = []
+        for piece in _stream_openrouter(prompt, model, max_tokens=tokens):
+            pieces.append(piece)
+            yield piece
+        return "".join(pieces).strip()
+
+    with metrics.track("video_script", chunks=len(body_plan) + 2):
+        intro = yield from section(intro_prompt, intro_tokens)
+        yield "\n\n"
+
+        body_chunks = []
+        for i, (prompt, tokens) in enumerate(body_plan):
+            if i:
+                yield " "
+            body_chunks.append((yield from section(prompt, tokens)))
+        body = " ".join(body_chunks)
+        yield "\n\n"
+
+        conclusion = yield from section(conclusion_prompt, conclusion_tokens)
+
+    script_text, script_json = _script_json(topic, style, duration, intro, body, conclusion)
+    if result is not None:
+        result["script_text"] = script_text
+        result["script_json"] = script_json
+
+
 def video_to_audio(script_text: str, lang="en"):
-    """Convert video script narration into one MP3 file."""
-    os.makedirs("temp", exist_ok=True)
-    filename = f"temp/{uuid.uuid4().hex}_video_script.mp3"
+    """Convert video script narration into one MP3 file (reused if the same script was converted)."""
+    workspace = get_workspace()
+    filename = workspace.content_path("video_script", lang, script_text, suffix=".mp3")
+    if os.path.exists(filename):
+        workspace.touch(filename)
+        return filename
+
+    tmp_path = workspace.temp_path(".mp3.part")
     tts = gTTS(text=script_text, lang=lang, tld="com")
-    tts.save(filename)
+    tts.save(tmp_path)
+    os.replace(tmp_path, filename)
+    workspace.register(filename)
     return filename
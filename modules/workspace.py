@@ -0,0 +1,176 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# Managed temp/ workspace: content-addressed files, ref-counted handles, byte quota
+TEMP_DIR = os.getenv("NATIQ_TEMP_DIR", "temp")
+TEMP_QUOTA_MB = int(os.getenv("NATIQ_TEMP_QUOTA_MB", 2048))
+ORPHAN_AGE_SEC = int(os.getenv("NATIQ_ORPHAN_AGE_SEC", 6 * 3600))
+PARTIAL_AGE_SEC = 600   # partial writes younger than this may still be in progress
+
+# Leftovers of interrupted writes (ours, yt-dlp's and ffmpeg's)
+PARTIAL_SUFFIXES = (".part", ".tmp", ".ytdl", ".temp")
+
+
+class Workspace:
+    """
+    A directory of working files that cleans up after itself.
+    Files are named by content hash (so identical uploads share one file),
+    files in use are protected by reference-counted handles, and the least
+    recently used unreferenced files are deleted once the byte quota is exceeded.
+    """
+
+    def __init__(self, root: str = TEMP_DIR, quota_bytes: int = TEMP_QUOTA_MB * 1024 * 1024):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self._refs = {}
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def contains(self, path: str) -> bool:
+        """Whether path names a file directly inside the workspace."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root)
+
+    def content_path(self, *parts: str, suffix: str = "") -> str:
+        """Deterministic path for content derived from parts (e.g. TTS text + language)."""
+        digest = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:32]
+        return self.path(f"{digest}{suffix}")
+
+    def temp_path(self, suffix: str = ".tmp") -> str:
+        """Unique scratch path inside the workspace (swept if never renamed)."""
+        return self.path(f".{uuid.uuid4().hex}{suffix}")
+
+    def store_stream(self, fileobj, suffix: str = "", block_size: int = 1 << 20) -> str:
+        """
+        Copy a file-like object into the workspace under its content hash.
+        An identical file that already exists is reused instead of written twice.
+        """
+        tmp_path = self.temp_path(".part")
+        sha = hashlib.sha256()
+        with open(tmp_path, "wb") as f:
+            for block in iter(lambda: fileobj.read(block_size), b""):
+                sha.update(block)
+                f.write(block)
+
+        path = self.path(f"{sha.hexdigest()[:32]}{suffix}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            self.touch(path)
+        else:
+            os.replace(tmp_path, path)
+            self.register(path)
+        return path
+
+    def register(self, path: str):
+        """Mark a newly written file as recently used and enforce the quota (sparing that file)."""
+        self.touch(path)
+        self.enforce_quota(keep=path)
+
+    def touch(self, path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def acquire(self, path: str):
+        key = os.path.abspath(path)
+        with self._lock:
+            self._refs[key] = self._refs.get(key, 0) + 1
+        self.touch(path)
+
+    def release(self, path: str):
+        key = os.path.abspath(path)
+        with self._lock:
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+            else:
+                self._refs.pop(key, None)
+
+    @contextmanager
+    def handle(self, path: str):
+        """Keep path from being evicted while the block runs."""
+        self.acquire(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _files(self):
+        """(mtime, size, path) of every regular file in the workspace."""
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file():
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    @staticmethod
+    def _is_partial(path: str) -> bool:
+        return path.endswith(PARTIAL_SUFFIXES) or os.path.basename(path).startswith(".")
+
+    def usage(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def _remove(self, path: str) -> bool:
+        if os.path.abspath(path) in self._refs:
+            return False
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def enforce_quota(self, keep: str = None):
+        """
+        Delete least recently used unreferenced files until usage fits the quota.
+        keep (e.g. the file just written, which its caller is about to return) is never deleted.
+        """
+        keep = os.path.abspath(keep) if keep else None
+        with self._lock:
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.quota_bytes:
+                    break
+                if os.path.abspath(path) == keep:
+                    continue
+                # Files still being written are left to sweep()
+                if not self._is_partial(path) and self._remove(path):
+                    total -= size
+
+    def sweep(self, max_age_sec: int = ORPHAN_AGE_SEC):
+        """
+        Startup cleanup: remove partial writes, empty files and files untouched
+        for max_age_sec, then enforce the quota.
+        """
+        now = time.time()
+        with self._lock:
+            for mtime, size, path in self._files():
+                age = now - mtime
+                if ((self._is_partial(path) or size == 0) and age > PARTIAL_AGE_SEC) or age > max_age_sec:
+                    self._remove(path)
+        self.enforce_quota()
+
+
+_workspace = None
+_workspace_lock = threading.Lock()
+
+
+def get_workspace() -> Workspace:
+    """Return the process-wide workspace, sweeping orphaned files on first use."""
+    global _workspace
+    with _workspace_lock:
+        if _workspace is None:
+            _workspace = Workspace()
+            _workspace.sweep()
+        return _workspace
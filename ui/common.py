@@ -0,0 +1,43 @@
+import html
+import streamlit as st
+from modules import transcriber
+from modules.workspace import get_workspace
+
+
+def live_transcribe(audio_path: str, lang="auto", label="📝 Transcribing..."):
+    """
+    Transcribe with transcriber.transcribe_stream and render the transcript
+    progressively as each chunk arrives. Returns the full transcript text.
+    """
+    status = st.empty()
+    live = st.empty()
+    parts = []
+
+    with st.spinner(label), get_workspace().handle(audio_path):
+        for part in transcriber.transcribe_stream(audio_path, lang=lang):
+            if part["text"]:
+                parts.append(part["text"])
+            status.caption(f"⏱️ Transcribed up to {part['end']:.0f}s")
+            live.markdown(f"""
+            <div style="background:#f0f2f6;padding:10px;border-radius:10px;max-height:250px;overflow-y:auto">
+                {html.escape(" ".join(parts))}
+            </div>
+            """, unsafe_allow_html=True)
+
+    status.empty()
+    live.empty()
+    return " ".join(parts)
+
+
+def stream_text(chunks, label: str = None) -> str:
+    """
+    Render an LLM token stream live with st.write_stream, then clear it so the
+    page can show the final text in its usual place. Returns the full text.
+    """
+    live = st.empty()
+    with live.container():
+        if label:
+            st.caption(label)
+        text = st.write_stream(chunks)
+    live.empty()
+    return text if isinstance(text, str) else "".join(map(str, text))
@@ -1,7 +1,8 @@
 import streamlit as st
 import json
 import time
-from modules import downloader, transcriber, diarization, notifier
+from modules import downloader, diarization, notifier
+from ui.common import live_transcribe
 
 
 def render(model="mistralai/mistral-nemo-instruct-2407"):
@@ -23,11 +24,10 @@ def render(model="mistralai/mistral-nemo-instruct-2407"):
         total_start = time.time()
 
         # 📝 Transcription
-        with st.spinner("📝 Transcribing..."):
-            t1 = time.time()
-            transcript = transcriber.transcribe(audio_path, lang=lang_choice)
-            t2 = time.time()
-            transcription_time = t2 - t1
+        t1 = time.time()
+        transcript = live_transcribe(audio_path, lang=lang_choice)
+        t2 = time.time()
+        transcription_time = t2 - t1
 
         # 🤖 Diarization
         with st.spinner("🤖 Splitting speakers..."):
@@ -1,5 +1,6 @@
 import streamlit as st
-from modules import downloader, transcriber, qa, notifier
+from modules import downloader, qa, notifier
+from ui.common import live_transcribe, stream_text
 
 def render(model="mistralai/mistral-nemo-instruct-2407"):
     st.subheader("❓ Question Answering")
@@ -27,8 +28,9 @@ def render(model="mistralai/mistral-nemo-instruct-2407"):
                 st.warning("⚠️ Please upload a file or enter a YouTube URL.")
                 return
 
-            with st.spinner("📝 Transcribing (first time only)..."):
-                st.session_state.qa_transcript = transcriber.transcribe(audio_path, lang=lang_choice)
+            st.session_state.qa_transcript = live_transcribe(
+                audio_path, lang=lang_choice, label="📝 Transcribing (first time only)..."
+            )
 
         transcript = st.session_state.qa_transcript
 
@@ -38,8 +40,8 @@ def render(model="mistralai/mistral-nemo-instruct-2407"):
             return
 
         # 🔹 Step 3: Get answer
-        with st.spinner("🤖 Asking Mistral..."):
-            answer = qa.answer_question(question_input, transcript, model=model)
+        answer = stream_text(qa.answer_question_stream(question_input, transcript, model=model),
+                             label="🤖 Asking Mistral...")
 
         # Save Q&A in history
         st.session_state.qa_history.append({"q": question_input, "a": answer})
@@ -1,5 +1,6 @@
 import streamlit as st
-from modules import downloader, sentiment, transcriber, notifier
+from modules import downloader, sentiment, notifier
+from ui.common import live_transcribe
 
 def render(model="mistralai/mistral-nemo-instruct-2407"):
     st.subheader("💭 Sentiment Analysis")
@@ -27,9 +28,10 @@ def render(model="mistralai/mistral-nemo-instruct-2407"):
                     st.warning("⚠️ Please enter text, upload a file, or paste a YouTube link.")
                     return
 
-                with st.spinner("📝 Transcribing audio/video..."):
-                    text_to_analyze = transcriber.transcribe(audio_path, lang=lang_choice)
-                    st.session_state.sentiment_transcript = text_to_analyze
+                text_to_analyze = live_transcribe(
+                    audio_path, lang=lang_choice, label="📝 Transcribing audio/video..."
+                )
+                st.session_state.sentiment_transcript = text_to_analyze
 
         with st.spinner("🔎 Running sentiment analysis..."):
             result = sentiment.analyze_sentiment(text_to_analyze, model=model)
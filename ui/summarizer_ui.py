@@ -1,5 +1,7 @@
 import streamlit as st
 from modules import downloader, transcriber, summarizer, notifier
+from modules.workspace import get_workspace
+from ui.common import stream_text
 
 def render(model="mistralai/mistral-7b-instruct"):
     st.subheader("📝 Summarize")
@@ -14,6 +16,8 @@ def render(model="mistralai/mistral-7b-instruct"):
         st.session_state.sum_transcript = None
     if "sum_summary" not in st.session_state:
         st.session_state.sum_summary = None
+    if "sum_language" not in st.session_state:
+        st.session_state.sum_language = None
 
     if st.button("🚀 Summarize"):
         if st.session_state.sum_transcript is None:
@@ -25,27 +29,41 @@ def render(model="mistralai/mistral-7b-instruct"):
                 st.warning("⚠️ Please upload a file or enter a YouTube URL.")
                 return
 
-            with st.spinner("📝 Transcribing..."):
-                st.session_state.sum_transcript = transcriber.transcribe(audio_path, lang=lang_choice)
+            with st.spinner("📝 Transcribing..."), get_workspace().handle(audio_path):
+                transcript = transcriber.transcribe_segments(audio_path, lang=lang_choice)
+                # Keep the segments so chunking cuts between them
+                st.session_state.sum_transcript = transcript
+                st.session_state.sum_language = transcript.language
 
-        with st.spinner("📌 Summarizing..."):
-            st.session_state.sum_summary = summarizer.summarize_text(
-                st.session_state.sum_transcript, lang=lang_choice, mode=mode
+        # Route "auto" by the language Whisper detected for the file
+        summary_lang = lang_choice
+        if summary_lang == "auto":
+            summary_lang = st.session_state.sum_language or "en"
+
+        if mode == "llm":
+            st.session_state.sum_summary = stream_text(
+                summarizer.summarize_llm_stream(st.session_state.sum_transcript, lang=summary_lang),
+                label="📌 Summarizing..."
             )
+        else:
+            with st.spinner("📌 Summarizing..."):
+                st.session_state.sum_summary = summarizer.summarize_text(
+                    st.session_state.sum_transcript, lang=summary_lang, mode=mode
+                )
 
         st.success("✅ Summary generated!")
 
     # Show transcript + summary
     if st.session_state.sum_transcript:
         st.subheader("Transcript")
-        st.text_area("Transcript", st.session_state.sum_transcript, height=200)
+        st.text_area("Transcript", st.session_state.sum_transcript.text, height=200)
 
     if st.session_state.sum_summary:
         st.subheader("📌 Summary")
         st.markdown(st.session_state.sum_summary)
 
         # Save formatted text for sharing
-        share_text = f"📝 Transcript & Summary\n\n---\n\n📜 Transcript:\n{st.session_state.sum_transcript[:2000]}...\n\n📌 Summary:\n{st.session_state.sum_summary}"
+        share_text = f"📝 Transcript & Summary\n\n---\n\n📜 Transcript:\n{st.session_state.sum_transcript.text[:2000]}...\n\n📌 Summary:\n{st.session_state.sum_summary}"
         st.session_state["summary_output"] = share_text
 
         # 📤 Share via Telegram/Email
@@ -1,5 +1,7 @@
 import streamlit as st
 from modules import downloader, transcriber, translator, notifier
+from modules.workspace import get_workspace
+from ui.common import stream_text
 
 def render(model="mistralai/mistral-7b-instruct"):
     st.subheader("🌍 Translate Audio/Video")
@@ -14,6 +16,8 @@ def render(model="mistralai/mistral-7b-instruct"):
         st.session_state.transcript = None
     if "translation" not in st.session_state:
         st.session_state.translation = None
+    if "transcript_language" not in st.session_state:
+        st.session_state.transcript_language = None
 
     if st.button("🚀 Translate"):
         if st.session_state.transcript is None:
@@ -25,13 +29,22 @@ def render(model="mistralai/mistral-7b-instruct"):
                 st.warning("⚠️ Please upload a file or enter a YouTube URL.")
                 return
 
-            with st.spinner("📝 Transcribing..."):
-                st.session_state.transcript = transcriber.transcribe(audio_path)
+            with st.spinner("📝 Transcribing..."), get_workspace().handle(audio_path):
+                transcript = transcriber.transcribe_segments(audio_path)
+                st.session_state.transcript = transcript.text
+                st.session_state.transcript_language = transcript.language
 
-        with st.spinner("🌍 Translating..."):
-            st.session_state.translation = translator.translate_text(
-                st.session_state.transcript, target_lang=target_lang, mode=mode
+        if mode == "llm" and st.session_state.transcript_language != target_lang:
+            st.session_state.translation = stream_text(
+                translator.translate_llm_stream(st.session_state.transcript, target_lang=target_lang),
+                label="🌍 Translating..."
             )
+        else:
+            with st.spinner("🌍 Translating..."):
+                st.session_state.translation = translator.translate_text(
+                    st.session_state.transcript, target_lang=target_lang, mode=mode,
+                    source_lang=st.session_state.transcript_language
+                )
 
         st.success("✅ Translation completed!")
 
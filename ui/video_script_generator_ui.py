@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 from modules import video_script_generator, notifier  
+from ui.common import stream_text
 
 def render(model="mistralai/mistral-7b-instruct"):
     st.subheader("🎬 Video Script Generator")
@@ -20,25 +21,27 @@ def render(model="mistralai/mistral-7b-instruct"):
             st.warning("⚠️ Please enter a topic.")
             return
 
-        with st.spinner("📝 Generating structured video script..."):
-            script_text, script_json = video_script_generator.generate_structured_video_script(
-                topic, style, duration, model
-            )
-            st.session_state.video_script = script_text
-            st.session_state.video_json = script_json
-
-            # Use pre-generated chunks from JSON
-            script_chunks_for_msg = script_json.get("chunks", [])
-
-            notification_lines = [
-                f"🎬 *New Video Script Generated!*",
-                f"📝 Topic: {topic}",
-                f"🎨 Style: {style}",
-                f"⏱️ Duration: {duration} min (approx.)",
-                f"📊 Word Count: {len(script_text.split())}",
-                "\n".join(script_chunks_for_msg)
-            ]
-            st.session_state.notification_message = "\n\n".join(notification_lines)
+        result = {}
+        stream_text(
+            video_script_generator.generate_structured_video_script_stream(topic, style, duration, model, result=result),
+            label="📝 Generating structured video script..."
+        )
+        script_text, script_json = result["script_text"], result["script_json"]
+        st.session_state.video_script = script_text
+        st.session_state.video_json = script_json
+
+        # Use pre-generated chunks from JSON
+        script_chunks_for_msg = script_json.get("chunks", [])
+
+        notification_lines = [
+            f"🎬 *New Video Script Generated!*",
+            f"📝 Topic: {topic}",
+            f"🎨 Style: {style}",
+            f"⏱️ Duration: {duration} min (approx.)",
+            f"📊 Word Count: {len(script_text.split())}",
+            "\n".join(script_chunks_for_msg)
+        ]
+        st.session_state.notification_message = "\n\n".join(notification_lines)
 
         st.success("✅ Video script generated!")
 